@@ -0,0 +1,196 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import stat
+from pathlib import Path
+from typing import Optional
+
+import anyio
+from jinja2 import pass_context
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # opcional: sem ele só há variantes .gz
+    brotli = None
+
+BASE_DIR = Path(__file__).resolve().parent
+STATIC_DIR = BASE_DIR / "static"
+ASSETS_BUILD_DIR = Path(os.getenv("ASSETS_BUILD_DIR", str(BASE_DIR / ".static_build")))
+MANIFEST_NAME = "manifest.json"
+
+COMPRESSIBLE = {".css", ".js", ".map", ".svg", ".html", ".json", ".txt"}
+COMPRESS_MIN_SIZE = 256
+IMMUTABLE = "public, max-age=31536000, immutable"
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _hashed_name(rel: str, data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    root, ext = os.path.splitext(rel)
+    return f"{root}.{digest}{ext}"
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def build_assets(static_dir: Path = STATIC_DIR, build_dir: Path = ASSETS_BUILD_DIR) -> dict:
+    """Copia cada ficheiro de static/ com o hash do conteúdo no nome, mais .gz/.br.
+
+    Devolve (e grava em manifest.json) {"css/base.css": "css/base.<hash>.css", ...}.
+    """
+    manifest = {}
+    for source in sorted(p for p in static_dir.rglob("*") if p.is_file()):
+        rel = source.relative_to(static_dir).as_posix()
+        data = source.read_bytes()
+        hashed = _hashed_name(rel, data)
+        target = build_dir / hashed
+        manifest[rel] = hashed
+        if target.exists():
+            continue  # mesmo hash = mesmo conteúdo, já foi gerado
+        _write_atomic(target, data)
+        if source.suffix not in COMPRESSIBLE or len(data) < COMPRESS_MIN_SIZE:
+            continue
+        variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(data, quality=11)
+        for suffix, packed in variants.items():
+            if len(packed) < len(data):
+                _write_atomic(target.with_name(target.name + suffix), packed)
+    _write_atomic(build_dir / MANIFEST_NAME, json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def _is_stale(static_dir: Path, build_dir: Path) -> bool:
+    manifest_path = build_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return True
+    built_at = manifest_path.stat().st_mtime
+    return any(p.stat().st_mtime > built_at for p in static_dir.rglob("*") if p.is_file())
+
+
+class AssetManifest:
+    def __init__(self, build_dir: Path = ASSETS_BUILD_DIR):
+        self.build_dir = build_dir
+        self.files: dict = {}
+        self.hashed: frozenset = frozenset()
+
+    def load(self) -> None:
+        try:
+            self.files = json.loads((self.build_dir / MANIFEST_NAME).read_text())
+        except (OSError, ValueError):
+            self.files = {}
+        self.hashed = frozenset(self.files.values())
+
+    def load_current(self, static_dir: Path = STATIC_DIR) -> bool:
+        """No arranque: usa o build feito no deploy (`python assets.py`), se estiver em dia.
+
+        Não gera nada aqui (brotli 11 em tudo custava segundos a cada arranque a frio):
+        sem build, ou com static/ mais novo que ele, os templates usam /static sem hash.
+        """
+        if _is_stale(static_dir, self.build_dir):
+            self.files, self.hashed = {}, frozenset()
+            print("ASSETS: no current build in", self.build_dir, "- serving unhashed /static (run `python assets.py`)")
+            return False
+        self.load()
+        return True
+
+    def resolve(self, path: str) -> str:
+        # sem build (ou ficheiro novo) cai no nome original, servido sem immutable
+        return self.files.get(path, path)
+
+
+manifest = AssetManifest()
+
+
+@pass_context
+def asset_url(context, path: str) -> str:
+    """Template helper: {{ asset_url('css/base.css') }} -> /static/css/base.<hash>.css"""
+    return str(context["request"].url_for("static", path=manifest.resolve(path)))
+
+
+def _accepted_encodings(scope: Scope) -> set:
+    value = Headers(scope=scope).get("accept-encoding", "")
+    accepted = set()
+    for part in value.split(","):
+        coding, _, params = part.strip().partition(";")
+        name, _, q = params.strip().partition("=")
+        try:
+            if name.strip() == "q" and float(q) == 0:
+                continue  # "br;q=0" = recusado explicitamente
+        except ValueError:
+            pass
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles que serve os nomes com hash a partir do build, com .br/.gz e immutable.
+
+    Os nomes originais (ex.: bootstrap.js.map referido dentro do .js) continuam
+    a vir de static/, com ETag/Last-Modified como antes.
+    """
+
+    def __init__(self, *, directory, manifest: AssetManifest, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.manifest = manifest
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        rel = path.replace(os.sep, "/")
+        if rel not in self.manifest.hashed:
+            return await super().get_response(path, scope)
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405)
+
+        full_path = self.manifest.build_dir / rel
+        media_type = mimetypes.guess_type(rel)[0] or "text/plain"
+        accepted = _accepted_encodings(scope)
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted:
+                found = await anyio.to_thread.run_sync(self._stat, full_path.with_name(full_path.name + suffix))
+                if found is not None:
+                    return self._immutable_response(found, scope, media_type, encoding)
+        found = await anyio.to_thread.run_sync(self._stat, full_path)
+        if found is None:
+            raise HTTPException(status_code=404)
+        return self._immutable_response(found, scope, media_type, None)
+
+    @staticmethod
+    def _stat(path: Path) -> Optional[tuple]:
+        try:
+            result = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return (path, result) if stat.S_ISREG(result.st_mode) else None
+
+    def _immutable_response(self, found: tuple, scope: Scope, media_type: str, encoding: Optional[str]) -> Response:
+        full_path, stat_result = found
+        headers = {"Cache-Control": IMMUTABLE, "Vary": "Accept-Encoding"}
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        response = FileResponse(full_path, stat_result=stat_result, media_type=media_type, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def clean_build(build_dir: Path = ASSETS_BUILD_DIR) -> None:
+    shutil.rmtree(build_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    # python assets.py  -> gera .static_build/ (correr no deploy, antes de arrancar)
+    clean_build()
+    built = build_assets()
+    print(f"{len(built)} assets -> {ASSETS_BUILD_DIR} (brotli: {'yes' if brotli else 'no'})")
@@ -0,0 +1,89 @@
+"""Peak RSS do export de todos: carregar tudo (antigo read_all) vs stream por chunks.
+
+    python benchmarks/export_rss.py --rows 1000000
+
+Cada modo corre num processo à parte para o ru_maxrss não se misturar.
+Usa uma base SQLite temporária (sqlite+aiosqlite), a não ser que DATABASE_URL
+já esteja definido e a tabela todos tenha dados.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def seed(path: str, rows: int):
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, email TEXT, first_name TEXT, "
+                "last_name TEXT, role TEXT, hashed_password TEXT, is_active BOOLEAN)")
+    con.execute("CREATE TABLE todos (id INTEGER PRIMARY KEY, title TEXT, description TEXT, priority INTEGER, "
+                "complete BOOLEAN, owner_id INTEGER REFERENCES users(id))")
+    con.execute("INSERT INTO users VALUES (1, 'bench', 'bench@x', 'b', 'b', 'admin', '', 1)")
+    con.executemany(
+        "INSERT INTO todos (title, description, priority, complete, owner_id) VALUES (?, ?, ?, ?, 1)",
+        ((f"todo {i}", f"description for todo number {i}", i % 5 + 1, i % 2) for i in range(rows)),
+    )
+    con.commit()
+    con.close()
+
+
+def max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def run_mode(mode: str):
+    sys.path.insert(0, str(ROOT))
+    from fastapi.encoders import jsonable_encoder
+    from sqlalchemy import select
+    import models as md
+    from database import AsyncSessionLocal
+    from export import ExportFormat, EXPORT_COLUMNS, _export_rows
+
+    baseline = max_rss_mb()
+    start = time.perf_counter()
+    size = 0
+    if mode == "all":
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(md.Todos))
+            rows = jsonable_encoder(result.scalars().all())
+            size = len(rows)
+    else:
+        stmt = select(*EXPORT_COLUMNS).order_by(md.Todos.id)
+        async for chunk in _export_rows(stmt, ExportFormat(mode)):
+            size += chunk.count("\n")
+    elapsed = time.perf_counter() - start
+    print(f"{mode:>7}: rows={size:>9}  time={elapsed:6.2f}s  peak_rss={max_rss_mb():8.1f} MB  (import baseline {baseline:.1f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--mode", choices=["all", "ndjson", "csv"])
+    args = parser.parse_args()
+
+    if args.mode:
+        asyncio.run(run_mode(args.mode))
+        return
+
+    env = dict(os.environ)
+    with tempfile.TemporaryDirectory() as tmp:
+        if "DATABASE_URL" not in env:
+            path = os.path.join(tmp, "bench.db")
+            print(f"seeding {args.rows} todos ...")
+            seed(path, args.rows)
+            env["DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+        for mode in ("ndjson", "csv", "all"):
+            subprocess.run([sys.executable, __file__, "--mode", mode], env=env, check=True)
+
+
+if __name__ == "__main__":
+    main()
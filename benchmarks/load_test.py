@@ -0,0 +1,269 @@
+"""Load test reprodutível de todos os endpoints principais.
+
+    python benchmarks/load_test.py --users 20 --todos 200 --concurrency 32 --duration 20 --out run.json
+    python benchmarks/load_test.py ... --compare baseline.json --threshold 0.15
+
+Arranca `uvicorn main:app` num subprocesso contra uma base SQLite temporária
+(sqlite+aiosqlite), semeia N users e M todos por user e corre uma mistura de
+pedidos (login, listas, página de todos, create/update/delete, static) com
+concorrência fixa. O resultado sai em JSON: throughput e p50/p95/p99 por rota.
+
+Com --compare, compara com um JSON anterior e sai com código 1 se alguma rota
+perdeu mais de --threshold de throughput ou ganhou mais de --threshold no p95.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+PASSWORD = "bench-password"
+
+# (nome da rota, peso na mistura)
+DEFAULT_MIX = {
+    "POST /auth/token": 5,
+    "GET /todos/get-all": 35,
+    "GET /todos/todo-page": 15,
+    "POST /todos/create-todo": 10,
+    "PUT /todos/update-todos/{id}": 10,
+    "DELETE /todos/del-todo/{id}": 5,
+    "GET /static/css/base.css": 20,
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed(db_path: str, users: int, todos: int, seed_value: int):
+    """Cria o schema e os dados direto no SQLite (mais rápido do que pela API)."""
+    env_url = os.environ.get("DATABASE_URL")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+    sys.path.insert(0, str(ROOT))
+    from sqlalchemy import create_engine
+
+    import models as md
+    from security import bcrypt_context
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    md.Base.metadata.create_all(engine)
+    engine.dispose()
+    if env_url is not None:
+        os.environ["DATABASE_URL"] = env_url
+
+    rng = random.Random(seed_value)
+    hashed = bcrypt_context.hash(PASSWORD)
+    con = sqlite3.connect(db_path)
+    con.executemany(
+        "INSERT INTO users (id, username, email, first_name, last_name, role, hashed_password, is_active) "
+        "VALUES (?, ?, ?, 'bench', 'bench', 'user', ?, 1)",
+        ((i, f"bench{i}", f"bench{i}@example.com", hashed) for i in range(1, users + 1)),
+    )
+    con.executemany(
+        "INSERT INTO todos (title, description, priority, complete, owner_id) VALUES (?, ?, ?, ?, ?)",
+        ((f"todo {u}-{t}", f"seeded todo {t} of user {u}", rng.randint(1, 5), rng.random() < 0.5, u)
+         for u in range(1, users + 1) for t in range(todos)),
+    )
+    con.commit()
+    con.close()
+
+
+def start_server(db_path: str, port: int, workers: int = 0) -> subprocess.Popen:
+    # um só cliente local a gerar toda a carga: sem rate limit/shedding, que é a capacidade que se mede
+    env = dict(os.environ, DATABASE_URL=f"sqlite+aiosqlite:///{db_path}")
+    env.setdefault("RATE_LIMIT_ENABLED", "false")
+    env.setdefault("SHED_MAX_IN_FLIGHT", "0")
+    env.setdefault("SHED_MAX_POOL_WAIT", "0")
+    # workers > 0: pelo launcher (serve.py, N processos); 0: um só `uvicorn main:app`
+    if workers:
+        cmd = [sys.executable, "serve.py", "--workers", str(workers)]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "main:app"]
+    # o master escreve "SERVE: N workers ready" quando todos (não só o primeiro) aceitam pedidos
+    log_path = Path(db_path + ".serve.log")
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen(
+            cmd + ["--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+            cwd=ROOT, env=env, stdout=log,
+        )
+    deadline = time.time() + 30 + 5 * workers
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        if workers and "workers ready" not in log_path.read_text():
+            time.sleep(0.2)
+            continue
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/auth/login-page").status_code == 200:
+                return proc
+        except httpx.TransportError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("server did not become ready in time")
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, username: str, rng: random.Random):
+        self.client = client
+        self.username = username
+        self.rng = rng
+        self.own_ids: list[int] = []
+
+    async def login(self):
+        r = await self.client.post("/auth/login", data={"username": self.username, "password": PASSWORD})
+        self.client.cookies.set("access_token", r.cookies["access_token"])
+        r = await self.client.get("/todos/get-all", params={"limit": 500})
+        self.own_ids = [t["id"] for t in r.json()]
+
+    def _todo_body(self) -> dict:
+        return {"title": f"load {self.rng.randint(0, 10**6)}", "description": "created by load test",
+                "priority": self.rng.randint(1, 5), "complete": self.rng.random() < 0.5}
+
+    async def run(self, route: str) -> httpx.Response:
+        c = self.client
+        if route == "POST /auth/token":
+            return await c.post("/auth/token", data={"username": self.username, "password": PASSWORD})
+        if route == "GET /todos/get-all":
+            return await c.get("/todos/get-all")
+        if route == "GET /todos/todo-page":
+            return await c.get("/todos/todo-page")
+        if route == "POST /todos/create-todo":
+            r = await c.post("/todos/create-todo", json=self._todo_body())
+            if r.status_code == 201:
+                self.own_ids.append(r.json()["id"])
+            return r
+        if route == "PUT /todos/update-todos/{id}" and self.own_ids:
+            return await c.put(f"/todos/update-todos/{self.rng.choice(self.own_ids)}", json=self._todo_body())
+        if route == "DELETE /todos/del-todo/{id}" and self.own_ids:
+            todo_id = self.own_ids.pop(self.rng.randrange(len(self.own_ids)))
+            return await c.delete(f"/todos/del-todo/{todo_id}")
+        if route == "GET /static/css/base.css":
+            return await c.get("/static/css/base.css")
+        # update/delete sem todos próprios -> cria um
+        return await self.run("POST /todos/create-todo")
+
+
+def summarize(samples: dict, elapsed: float) -> dict:
+    out = {}
+    for route, (latencies, errors) in sorted(samples.items()):
+        latencies = sorted(latencies)
+        n = len(latencies)
+        if not n:
+            continue
+        q = statistics.quantiles(latencies, n=100) if n > 1 else [latencies[0]] * 99
+        out[route] = {
+            "count": n,
+            "errors": errors,
+            "rps": round(n / elapsed, 2),
+            "p50_ms": round(q[49] * 1000, 3),
+            "p95_ms": round(q[94] * 1000, 3),
+            "p99_ms": round(q[98] * 1000, 3),
+        }
+    return out
+
+
+async def drive(base_url: str, args) -> dict:
+    rng = random.Random(args.seed)
+    routes, weights = zip(*DEFAULT_MIX.items())
+    samples = {route: ([], 0) for route in routes}
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+
+    clients = [httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) for _ in range(args.concurrency)]
+    vusers = [VirtualUser(c, f"bench{i % args.users + 1}", random.Random(args.seed + i)) for i, c in enumerate(clients)]
+    await asyncio.gather(*(v.login() for v in vusers))
+
+    stop_at = time.perf_counter() + args.duration
+
+    async def loop(vuser: VirtualUser):
+        while time.perf_counter() < stop_at:
+            route = rng.choices(routes, weights)[0]
+            start = time.perf_counter()
+            try:
+                r = await vuser.run(route)
+                ok = r.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies, errors = samples[route]
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                samples[route] = (latencies, errors + 1)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(loop(v) for v in vusers))
+    elapsed = time.perf_counter() - start
+    for c in clients:
+        await c.aclose()
+
+    routes_out = summarize(samples, elapsed)
+    all_latencies = sorted(lat for lats, _ in samples.values() for lat in lats)
+    total = summarize({"total": (all_latencies, sum(e for _, e in samples.values()))}, elapsed)["total"]
+    return {"elapsed_s": round(elapsed, 3), "total": total, "routes": routes_out}
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for route, base in baseline.get("routes", {}).items():
+        cur = current["routes"].get(route)
+        if cur is None:
+            continue
+        if cur["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(f"{route}: rps {base['rps']} -> {cur['rps']}")
+        if cur["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{route}: p95 {base['p95_ms']}ms -> {cur['p95_ms']}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--todos", type=int, default=200, help="todos por user")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="segundos")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--workers", type=int, default=0, help="N workers via serve.py (0 = uvicorn main:app)")
+    parser.add_argument("--out", help="ficheiro JSON de saída (default: stdout)")
+    parser.add_argument("--compare", help="JSON de um run anterior")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "load.db")
+        seed(db_path, args.users, args.todos, args.seed)
+        port = free_port()
+        server = start_server(db_path, port, args.workers)
+        try:
+            result = asyncio.run(drive(f"http://127.0.0.1:{port}", args))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    result["config"] = {k: v for k, v in vars(args).items() if k not in ("out", "compare")}
+    result["mix"] = DEFAULT_MIX
+    text = json.dumps(result, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+    else:
+        print(text)
+
+    if args.compare:
+        regressions = compare(result, json.loads(Path(args.compare).read_text()), args.threshold)
+        for line in regressions:
+            print("REGRESSION", line, file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""auth_guard: BaseHTTPMiddleware antigo vs AuthGuardMiddleware (ASGI puro).
+
+    python benchmarks/middleware_bench.py --requests 5000 --concurrency 50
+
+Corre tudo em processo via httpx.ASGITransport (sem rede), contra a mesma app
+com um guard ou outro, para uma rota estática e uma rota de API autenticada.
+Reporta requests/s, p50 e p99 por rota.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, Request, status  # noqa: E402
+from fastapi.responses import RedirectResponse  # noqa: E402
+from fastapi.staticfiles import StaticFiles  # noqa: E402
+from jose import JWTError  # noqa: E402
+
+from main import LOGIN_PATH, PUBLIC_EXACT, PUBLIC_PREFIXES, is_public  # noqa: E402
+from middleware import AuthGuardMiddleware  # noqa: E402
+from routers import users  # noqa: E402
+from routers.auth import create_access_token, decode_token  # noqa: E402
+
+
+def legacy_is_public(path: str) -> bool:
+    if path in PUBLIC_EXACT:
+        return True
+    return any(path.startswith(pfx + "/") or path == pfx for pfx in PUBLIC_PREFIXES)
+
+
+def build_app(kind: str) -> FastAPI:
+    app = FastAPI()
+    app.mount("/static", StaticFiles(directory=str(ROOT / "static")), name="static")
+    app.include_router(users.router)
+
+    if kind == "asgi":
+        app.add_middleware(AuthGuardMiddleware, is_public=is_public, login_path=LOGIN_PATH, decode_token=decode_token)
+        return app
+
+    # cópia do auth_guard antigo (@app.middleware("http"))
+    @app.middleware("http")
+    async def auth_guard(request: Request, call_next):
+        path = request.url.path
+        if legacy_is_public(path):
+            return await call_next(request)
+        token = None
+        auth_header = request.headers.get("authorization")
+        if auth_header and auth_header.lower().startswith("bearer "):
+            token = auth_header.split(" ", 1)[1]
+        if not token:
+            token = request.cookies.get("access_token")
+        if not token:
+            return RedirectResponse(LOGIN_PATH, status_code=status.HTTP_303_SEE_OTHER)
+        try:
+            payload = decode_token(token)
+            request.state.user = {"id": payload.get("id"), "username": payload.get("sub"), "role": payload.get("role")}
+        except JWTError:
+            return RedirectResponse(LOGIN_PATH, status_code=status.HTTP_303_SEE_OTHER)
+        return await call_next(request)
+
+    return app
+
+
+async def drive(app, path, headers, n, concurrency):
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        queue = iter(range(n))
+
+        async def worker():
+            for _ in queue:
+                start = time.perf_counter()
+                r = await client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                assert r.status_code == 200, (path, r.status_code)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": n / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    token = create_access_token("bench", 1, "user", timedelta(minutes=30))
+    routes = [
+        ("static", "/static/css/base.css", {}),
+        ("api", "/users/get_user", {"Authorization": f"Bearer {token}"}),
+    ]
+    for kind in ("basehttp", "asgi"):
+        app = build_app(kind)
+        for label, path, headers in routes:
+            await drive(app, path, headers, 200, args.concurrency)  # warmup
+            res = await drive(app, path, headers, args.requests, args.concurrency)
+            print(f"{kind:>9} {label:>6}: {res['rps']:8.0f} req/s  p50={res['p50_ms']:6.2f}ms  p99={res['p99_ms']:6.2f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""Custo de ler + serializar uma lista grande de todos: antes vs depois.
+
+    python benchmarks/serialize_bench.py --rows 10000 --repeat 5
+
+"Antes": select(md.Todos) (entidades ORM + identity map), sem response_model,
+por isso o FastAPI passa tudo pelo jsonable_encoder e pelo JSONResponse (json).
+"Depois": select(*TODO_COLUMNS) (Rows), dicts, response_model=list[TodoResponse]
+(pydantic-core) e ORJSONResponse. Usa o serialize_response do próprio FastAPI.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+from sqlalchemy import insert, select  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import models as md  # noqa: E402
+from database import Base  # noqa: E402
+from schema import TodoResponse  # noqa: E402
+from todo_cache import TODO_COLUMNS, todo_to_dict  # noqa: E402
+
+RESPONSE_FIELD = create_model_field(name="Response_todos", type_=list[TodoResponse], mode="serialization")
+
+
+async def before(session):
+    t0 = time.perf_counter()
+    todos = (await session.execute(select(md.Todos).order_by(md.Todos.id))).scalars().all()
+    t1 = time.perf_counter()
+    content = await serialize_response(response_content=todos)  # jsonable_encoder
+    body = JSONResponse(content).body
+    t2 = time.perf_counter()
+    session.expunge_all()
+    return t1 - t0, t2 - t1, len(body)
+
+
+async def after(session):
+    t0 = time.perf_counter()
+    rows = (await session.execute(select(*TODO_COLUMNS).order_by(md.Todos.id))).all()
+    todos = [todo_to_dict(row) for row in rows]
+    t1 = time.perf_counter()
+    content = await serialize_response(field=RESPONSE_FIELD, response_content=todos)
+    body = ORJSONResponse(content).body
+    t2 = time.perf_counter()
+    return t1 - t0, t2 - t1, len(body)
+
+
+def report(label, samples):
+    load = statistics.median(s[0] for s in samples) * 1000
+    ser = statistics.median(s[1] for s in samples) * 1000
+    print(f"{label:>8}: load {load:8.1f} ms   serialize {ser:8.1f} ms   total {load + ser:8.1f} ms   "
+          f"body {samples[0][2] / 1024:.0f} KiB")
+    return load + ser
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(md.Users.__table__).values(id=1, username="bench", email="bench@x"))
+        await conn.execute(insert(md.Todos.__table__), [
+            {"title": f"todo {i}", "description": "descrição " * 5, "priority": i % 9 + 1,
+             "complete": i % 3 == 0, "owner_id": 1}
+            for i in range(args.rows)
+        ])
+
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with Session() as session:
+        await before(session)
+        await after(session)  # aquecimento
+        old = report("before", [await before(session) for _ in range(args.repeat)])
+        new = report("after", [await after(session) for _ in range(args.repeat)])
+    print(f"{args.rows} rows, median of {args.repeat}: {old / new:.1f}x faster")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
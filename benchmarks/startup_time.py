@@ -0,0 +1,107 @@
+"""Tempo de arranque: import do main e spawn do uvicorn até à primeira resposta.
+
+    python benchmarks/startup_time.py --runs 5
+    python benchmarks/startup_time.py --runs 5 --app-dir /tmp/baseline   # outro checkout (antes/depois)
+
+Mede, em subprocessos novos (sem cache de módulos do processo pai):
+  import      `import main` sozinho
+  fresh-db    uvicorn até ao primeiro 200 em /auth/login-page, BD SQLite nova (cria o schema)
+  existing-db o mesmo, com a BD já criada (o arranque normal de um deploy/restart)
+O primeiro pedido renderiza um template, por isso também conta o que ficar para o
+primeiro pedido. Mediana e mínimo de --runs; com --out grava o JSON.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+FIRST_PATH = "/auth/login-page"
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_env(db_path: str, extra: dict) -> dict:
+    return dict(os.environ, DATABASE_URL=f"sqlite+aiosqlite:///{db_path}", **extra)
+
+
+def time_import(app_dir: Path, env: dict) -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=app_dir, env=env,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def time_first_response(app_dir: Path, env: dict, timeout: float = 30) -> float:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}{FIRST_PATH}"
+    # um só client: criar um por tentativa (contexto SSL) pesava mais do que o próprio poll
+    client = httpx.Client()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=app_dir, env=env,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            try:
+                if client.get(url).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            time.sleep(0.005)
+        raise RuntimeError(f"no response in {timeout}s")
+    finally:
+        client.close()
+        proc.terminate()
+        proc.wait()
+
+
+def summary(samples: list) -> dict:
+    return {"median_ms": round(statistics.median(samples) * 1000, 1), "min_ms": round(min(samples) * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--app-dir", type=Path, default=ROOT, help="checkout a medir (default: este)")
+    parser.add_argument("--warmup", action="store_true", help="arranca com STARTUP_WARMUP=true")
+    parser.add_argument("--out", type=Path, default=None)
+    args = parser.parse_args()
+
+    extra = {"STARTUP_WARMUP": "true" if args.warmup else "false"}
+    results = {"import": [], "fresh-db": [], "existing-db": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        shared_db = str(Path(tmp) / "existing.db")
+        time_first_response(args.app_dir, server_env(shared_db, extra))  # cria a BD "existente"
+        for run in range(args.runs):
+            results["import"].append(time_import(args.app_dir, server_env(shared_db, extra)))
+            fresh_db = str(Path(tmp) / f"fresh-{run}.db")
+            results["fresh-db"].append(time_first_response(args.app_dir, server_env(fresh_db, extra)))
+            results["existing-db"].append(time_first_response(args.app_dir, server_env(shared_db, extra)))
+
+    report = {name: summary(samples) for name, samples in results.items()}
+    for name, stats in report.items():
+        print(f"{name:>12}: median {stats['median_ms']:8.1f} ms   min {stats['min_ms']:8.1f} ms")
+    if args.out:
+        args.out.write_text(json.dumps({"app_dir": str(args.app_dir), "runs": args.runs,
+                                        "warmup": args.warmup, "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
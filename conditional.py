@@ -0,0 +1,38 @@
+import hashlib
+from email.utils import formatdate
+from typing import Optional
+
+from fastapi import Request, Response, status
+
+
+def make_etag(user_id, generation: int, key: str) -> str:
+    # a geração muda em cada escrita do user, por isso não é preciso hash do conteúdo
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    return f'W/"{user_id}.{generation}.{digest}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # comparação fraca: ignora o prefixo W/
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in header.split(","))
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    # só If-None-Match: o If-Modified-Since tem resolução de 1 s e uma escrita no
+    # mesmo segundo do último GET dava 304 velho (o Last-Modified fica informativo)
+    if_none_match = request.headers.get("if-none-match")
+    return if_none_match is not None and _etag_matches(if_none_match, etag)
+
+
+def set_validators(response: Response, etag: str, mtime: Optional[float]) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    if mtime is not None:
+        response.headers["Last-Modified"] = formatdate(mtime, usegmt=True)
+    return response
+
+
+def not_modified_response(etag: str, mtime: Optional[float]) -> Response:
+    return set_validators(Response(status_code=status.HTTP_304_NOT_MODIFIED), etag, mtime)
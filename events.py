@@ -0,0 +1,227 @@
+import asyncio
+import itertools
+import json
+import os
+import time
+from typing import Optional
+
+from database import DATABASE_URL
+
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+EVENTS_MAX_CONNECTIONS = int(os.getenv("EVENTS_MAX_CONNECTIONS", "10000"))
+EVENTS_RETRY_MS = 3000
+PG_CHANNEL = "todo_events"
+# o pg_notify recusa payloads com 8000 bytes ou mais
+PG_NOTIFY_MAX_BYTES = 8000
+
+RESYNC = {"type": "resync", "data": None}
+# não é enviado: termina o stream (worker a sair); o EventSource religa sozinho
+CLOSE = {"type": "close", "data": None}
+
+
+class Subscription:
+    """Uma ligação SSE: fila limitada; se o cliente não acompanhar, leva um "resync"."""
+
+    __slots__ = ("user_id", "queue", "dropped")
+
+    def __init__(self, user_id, maxsize: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def push(self, message: dict) -> bool:
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            # cliente lento: deita fora o atrasado e manda só "resync" (recarrega o quadro)
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            return False
+
+    def close(self) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(CLOSE)
+
+
+class LocalBroker:
+    """Pub/sub em processo (default): só chega às ligações deste worker."""
+
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE, max_connections: int = EVENTS_MAX_CONNECTIONS):
+        self.queue_size = queue_size
+        self.max_connections = max_connections
+        self._subscribers: dict = {}
+        self._ids = itertools.count(1)
+        self.connections = 0
+        self.published = 0
+        self.delivered = 0
+        self.resyncs = 0
+        self.draining = False
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    def subscribe(self, user_id) -> Optional[Subscription]:
+        if self.draining or self.connections >= self.max_connections:
+            return None
+        sub = Subscription(user_id, self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(sub)
+        self.connections += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._subscribers.get(sub.user_id)
+        if subs is None or sub not in subs:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._subscribers[sub.user_id]
+        self.connections -= 1
+
+    def drain(self) -> None:
+        """Worker a sair: fecha todos os streams para o browser religar a outro worker."""
+        self.draining = True
+        for subs in self._subscribers.values():
+            for sub in subs:
+                sub.close()
+
+    def _deliver(self, user_id, message: dict) -> None:
+        for sub in self._subscribers.get(user_id, ()):
+            if sub.push(message):
+                self.delivered += 1
+            else:
+                self.resyncs += 1
+
+    async def publish(self, user_id, event_type: str, data=None) -> None:
+        if user_id is None:
+            return
+        self.published += 1
+        self._deliver(user_id, {"id": next(self._ids), "type": event_type, "data": data})
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "connections": self.connections,
+            "users": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "resyncs": self.resyncs,
+            "draining": self.draining,
+        }
+
+
+class PostgresBroker(LocalBroker):
+    """LISTEN/NOTIFY: o publish vai ao Postgres e cada worker entrega às suas ligações."""
+
+    def __init__(self, dsn: str, channel: str = PG_CHANNEL, **kwargs):
+        super().__init__(**kwargs)
+        self.dsn = dsn
+        self.channel = channel
+        self._conn = None
+        self._lock = asyncio.Lock()
+        self.oversized = 0
+
+    async def start(self) -> None:
+        import asyncpg
+
+        self._conn = await asyncpg.connect(self.dsn)
+        await self._conn.add_listener(self.channel, self._on_notify)
+        self._conn.add_termination_listener(self._on_terminate)
+
+    async def close(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None and not conn.is_closed():
+            await conn.close()
+
+    def _on_notify(self, conn, pid, channel, payload: str) -> None:
+        message = json.loads(payload)
+        self._deliver(message.pop("user_id"), message)
+
+    def _on_terminate(self, conn) -> None:
+        if self._conn is conn:
+            self._conn = None
+            asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        delay = 0.5
+        while self._conn is None:
+            try:
+                await self.start()
+            except Exception as e:
+                print("EVENTS RECONNECT ERROR:", type(e).__name__, str(e))
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+        # o que se publicou entretanto perdeu-se: os clientes recarregam
+        for subs in self._subscribers.values():
+            for sub in subs:
+                sub.push(RESYNC)
+
+    async def publish(self, user_id, event_type: str, data=None) -> None:
+        if user_id is None:
+            return
+        self.published += 1
+        payload = json.dumps({"user_id": user_id, "id": next(self._ids), "type": event_type, "data": data})
+        if len(payload.encode()) >= PG_NOTIFY_MAX_BYTES:
+            # ex. um todo.batch com muitos ids: em vez de falhar, os clientes deste user recarregam
+            self.oversized += 1
+            payload = json.dumps({"user_id": user_id, **RESYNC})
+        try:
+            async with self._lock:
+                if self._conn is None:
+                    raise ConnectionError("LISTEN connection is down")
+                await self._conn.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+        except Exception as e:
+            # a escrita já foi feita; o evento é best-effort
+            print("EVENTS PUBLISH ERROR:", type(e).__name__, str(e))
+
+    def stats(self) -> dict:
+        return {**super().stats(), "oversized": self.oversized}
+
+
+def format_sse(message: dict) -> str:
+    return f"id: {message.get('id', 0)}\nevent: {message['type']}\ndata: {json.dumps(message['data'])}\n\n"
+
+
+async def sse_stream(broker: LocalBroker, sub: Subscription, expires_at: Optional[float] = None):
+    """Gera o stream SSE: eventos, heartbeat a cada EVENTS_HEARTBEAT s, e fecha no exp do token."""
+    try:
+        yield f"retry: {EVENTS_RETRY_MS}\n\n"
+        while True:
+            timeout = EVENTS_HEARTBEAT
+            if expires_at is not None:
+                remaining = expires_at - time.time()
+                if remaining <= 0:
+                    yield format_sse({"type": "expired", "data": None})
+                    return
+                timeout = min(timeout, remaining)
+            try:
+                message = await asyncio.wait_for(sub.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if message is CLOSE:
+                return
+            yield format_sse(message)
+    finally:
+        broker.unsubscribe(sub)
+
+
+def _make_broker() -> LocalBroker:
+    kind = os.getenv("EVENTS_BACKEND", "memory")
+    if kind == "postgres":
+        dsn = os.getenv("EVENTS_PG_URL") or (DATABASE_URL or "").replace("+asyncpg", "")
+        if not dsn:
+            # o DATABASE_URL já não é obrigatório no import: sem isto falhava com AttributeError
+            raise RuntimeError("EVENTS_BACKEND=postgres needs EVENTS_PG_URL or DATABASE_URL")
+        return PostgresBroker(dsn)
+    return LocalBroker()
+
+
+event_bus = _make_broker()
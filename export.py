@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+from enum import Enum
+
+from fastapi.responses import StreamingResponse
+
+from database import ReadSessionLocal
+import models as md
+
+EXPORT_CHUNK_ROWS = 1000
+EXPORT_COLUMNS = (md.Todos.id, md.Todos.title, md.Todos.description,
+                  md.Todos.priority, md.Todos.complete, md.Todos.owner_id)
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+
+def _ndjson_chunk(keys, rows) -> str:
+    return "".join(json.dumps(dict(zip(keys, row)), ensure_ascii=False) + "\n" for row in rows)
+
+
+def _csv_chunk(rows) -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue()
+
+
+async def _export_rows(stmt, fmt: ExportFormat):
+    # sessão própria (réplica, se houver): o get_db da rota fecha antes do body acabar de ser enviado
+    async with ReadSessionLocal() as session:
+        # server-side cursor -> só EXPORT_CHUNK_ROWS linhas em memória de cada vez
+        result = await session.stream(stmt.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        keys = list(result.keys())
+        if fmt is ExportFormat.csv:
+            yield _csv_chunk([keys])
+        async for rows in result.partitions():
+            yield _ndjson_chunk(keys, rows) if fmt is ExportFormat.ndjson else _csv_chunk(rows)
+
+
+def stream_todos(stmt, fmt: ExportFormat, filename: str) -> StreamingResponse:
+    """Envia o resultado de um select de colunas de Todos em NDJSON/CSV, por chunks."""
+    return StreamingResponse(
+        _export_rows(stmt, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt.value}"'},
+    )
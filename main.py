@@ -1,30 +1,80 @@
 # main.py
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from typing import Optional
 from fastapi import FastAPI, Request
 from fastapi.params import Depends
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
 from pathlib import Path
-from routers.auth import SECRET_KEY, ALGORITHM
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, RedirectResponse, PlainTextResponse
 from fastapi import status
-from jose import JWTError, jwt
-from routers.auth import get_current_user_silent
+from routers.auth import get_current_user_silent, decode_token
 import os
-import uvicorn
 
 
-from database import engine, Base
+from database import dispose_engines, get_engine, on_engine_created
+from migrations import ensure_schema
+from warmup import STARTUP_WARMUP, startup_state, warmup
+from security import password_hasher
+from middleware import AuthGuardMiddleware, CompressionMiddleware, PublicPathMatcher
+from assets import PrecompressedStaticFiles, manifest as asset_manifest
+from templating import templates
+from metrics import MetricsMiddleware, instrument_engine, register_stats, registry
+from token_cache import token_cache
+from profiling import ProfilingMiddleware, profiler
+import profiling
+from todo_cache import todo_cache
+from events import event_bus
+from write_behind import write_behind
+from ratelimit import (RATE_LIMIT_ENABLED, LoadShedMiddleware, RateLimitMiddleware,
+                       load_shedder, rate_limiter)
 from routers import auth, todos, admin, users
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # verifica a versão do schema (1 query) em vez do create_all a inspecionar cada tabela
+    startup_state["schema_version"] = await ensure_schema(get_engine())
+    asset_manifest.load_current()
+    if STARTUP_WARMUP:
+        startup_state["warmed"] = await warmup()
+    await event_bus.start()
+    await write_behind.start()
+    startup_state.update(pid=os.getpid(), startup_seconds=round(time.perf_counter() - started, 4), ready=True)
+    yield
+    # o servidor já parou de aceitar e esperou os pedidos em curso
+    startup_state["ready"] = False
+    # antes de fechar eventos e pools: os updates aceites em write-behind vão para a BD
+    await write_behind.close()
+    password_hasher.shutdown()
+    await event_bus.close()
+    await dispose_engines()
+
+
+def begin_drain() -> None:
+    """O worker vai sair (serve.py): /ready passa a 503 e os streams SSE fecham.
+
+    Sem isto o shutdown ficava à espera das ligações SSE, que nunca acabam sozinhas;
+    o EventSource do browser religa a outro worker e recarrega o quadro.
+    """
+    startup_state["ready"] = False
+    event_bus.drain()
+
+
+# orjson para todas as respostas JSON (o modelo de resposta já validou/serializou os dados)
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 BASE_DIR = Path(__file__).resolve().parent
-templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
 
+# nomes com hash (asset_url) vêm do build com .br/.gz e immutable; o resto de static/ como antes
 app.mount(
     "/static",
-    StaticFiles(directory=str(BASE_DIR / "static")),
+    PrecompressedStaticFiles(directory=str(BASE_DIR / "static"), manifest=asset_manifest),
     name="static",
 )
 
@@ -36,54 +86,53 @@ PUBLIC_EXACT = {
     "/auth/register",        # <- podes manter se existir
     "/auth/register-page",   # <- ADICIONA ESTE
     "/auth/create", 
+    "/auth/token",
     "/openapi.json",
     "/favicon.ico",
+    "/metrics",
+    "/ready",
 }
 
-def is_public(path: str) -> bool:
-    if path in PUBLIC_EXACT:
-        return True
-    return any(path.startswith(pfx + "/") or path == pfx for pfx in PUBLIC_PREFIXES)
-
-@app.middleware("http")
-async def auth_guard(request: Request, call_next):
-    path = request.url.path
-
-    # 1) Libera rotas públicas SEM QUALQUER VERIFICAÇÃO
-    if is_public(path):
-        return await call_next(request)
-
-    #Authorization: Bearer 
-    token = None
-    auth_header = request.headers.get("authorization")
-    if auth_header and auth_header.lower().startswith("bearer "):
-        token = auth_header.split(" ", 1)[1]
-    if not token:
-        token = request.cookies.get("access_token")
-
-    # Sem token -> redireciona para login
-    if not token:
-        if path != LOGIN_PATH:  # proteção extra contra loop
-            return RedirectResponse(LOGIN_PATH, status_code=status.HTTP_303_SEE_OTHER)
-        # se por algum motivo cair aqui no próprio login, apenas segue
-        return await call_next(request)
-
-    # com token valida
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        request.state.user = {
-            "id": payload.get("id") or payload.get("sub"),
-            "username": payload.get("sub"),
-            "role": payload.get("role"),
-        }
-    except JWTError:
-        # token inválido/expirado → manda para login (sem loop)
-        if path != LOGIN_PATH:
-            return RedirectResponse(LOGIN_PATH, status_code=status.HTTP_303_SEE_OTHER)
-        return await call_next(request)
-
-    # 5) OK → segue
-    return await call_next(request)
+is_public = PublicPathMatcher(PUBLIC_EXACT, PUBLIC_PREFIXES)
+
+# a mais interna: comprime JSON/HTML grandes; /static já vem pré-comprimido e o SSE não pode ficar em buffer
+app.add_middleware(CompressionMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=GZIP_LEVEL,
+                   skip_prefixes=("/static", "/todos/events"))
+# por dentro do auth_guard: chaveia pelo user do JWT (ou pelo IP nas rotas públicas)
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter, skip_prefixes=("/static", "/metrics", "/ready"))
+# ASGI puro: /static e restantes rotas públicas nem passam pelo parse de headers/cookies
+app.add_middleware(AuthGuardMiddleware, is_public=is_public, login_path=LOGIN_PATH, decode_token=decode_token)
+# por fora do auth_guard: sob carga recusa antes de decodificar tokens ou ir à BD
+app.add_middleware(LoadShedMiddleware, shedder=load_shedder, skip_prefixes=("/static", "/metrics"),
+                   long_lived_prefixes=("/todos/events",))
+# por fora do auth_guard, para contar também os redirects para o login (e os 503 do shedding)
+app.add_middleware(MetricsMiddleware)
+# só faz trabalho quando o pedido foi armado em /admin/profiling ou traz X-Profile assinado
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+# os engines só são criados no primeiro uso; a instrumentação liga-se nessa altura
+on_engine_created(instrument_engine)
+on_engine_created(lambda engine, role: profiling.instrument_engine(engine))
+register_stats("token_cache", "Verified JWT cache", token_cache.stats)
+register_stats("password_hasher", "bcrypt pool", password_hasher.stats)
+register_stats("todo_cache", "Per-user todo read cache", todo_cache.stats)
+register_stats("events", "Todo push channel (SSE)", event_bus.stats)
+register_stats("rate_limit", "Token-bucket rate limiter", rate_limiter.stats)
+register_stats("load_shed", "Load shedding", load_shedder.stats)
+register_stats("write_behind", "Write-behind todo updates", write_behind.stats)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    """Readiness para o load balancer: 503 até o schema estar confirmado (e o warmup feito)."""
+    return ORJSONResponse(startup_state, status_code=200 if startup_state["ready"] else 503)
         
     
 @app.get("/", name="index")
@@ -97,13 +146,12 @@ app.include_router(todos.router)
 app.include_router(admin.router)
 app.include_router(users.router)
 
-@app.on_event("startup")
-async def on_startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-        
+startup_state["import_seconds"] = round(time.perf_counter() - _IMPORT_STARTED, 4)
+
 
 if __name__ == "__main__":
-    # Usa PORT do ambiente (Koyeb) ou 10000 localmente
-    port = int(os.getenv("PORT", 10000))
-    uvicorn.run("main:app", host="0.0.0.0", port=port)
+    # Usa PORT do ambiente (Koyeb) ou 10000 localmente, com WEB_WORKERS processos.
+    # O launcher corre num processo limpo: os workers (spawn) não podem reimportar este __main__.
+    import sys
+
+    os.execv(sys.executable, [sys.executable, str(BASE_DIR / "serve.py"), *sys.argv[1:]])
@@ -0,0 +1,295 @@
+import math
+import time
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge:
+    """Gauge lida na hora do scrape (func devolve {labels: valor} ou um número)."""
+
+    def __init__(self, name: str, help: str, func: Callable, labelnames: tuple = ()):
+        self.name, self.help, self.func, self.labelnames = name, help, func, labelnames
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        values = self.func()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {float(value)}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple, labelnames: tuple = ()):
+        self.name, self.help, self.buckets, self.labelnames = name, help, buckets, labelnames
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        counts = entry[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total, count) in self._values.items():
+            for bound, n in zip(self.buckets, counts):
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {n}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {count}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def register_stats(prefix: str, help: str, stats: Callable[[], dict]) -> None:
+    """Exporta os campos numéricos de um `.stats()` (caches, pools...) como gauges."""
+    for key, value in stats().items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            registry.register(Gauge(f"{prefix}_{key}", f"{help} ({key}).",
+                                    lambda key=key: stats()[key]))
+
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route, method and status.", ("method", "route", "status")))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", LATENCY_BUCKETS, ("method", "route")))
+http_in_flight = {"value": 0}
+registry.register(Gauge("http_requests_in_flight", "Requests being handled right now.", lambda: http_in_flight["value"]))
+
+db_queries = registry.register(Counter("db_queries_total", "SQL statements executed, by verb.", ("verb",)))
+db_query_latency = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement latency, by verb.", QUERY_BUCKETS, ("verb",)))
+db_queries_per_request = registry.register(Histogram(
+    "db_queries_per_request", "SQL statements issued per request.", COUNT_BUCKETS, ("route",)))
+db_time_per_request = registry.register(Histogram(
+    "db_time_per_request_seconds", "Time spent in SQL per request.", LATENCY_BUCKETS, ("route",)))
+db_pool_wait = registry.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time to get a pooled connection, per request.", QUERY_BUCKETS, ("route",)))
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "pool_wait")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait = 0.0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+# ---------- SQLAlchemy ----------
+# role do engine ("primary", "replica") -> (estado do pool, sync_engine); uma família por gauge
+_pools: dict = {}
+
+
+def _pool_capacity(sync_engine) -> float:
+    pool = sync_engine.pool
+    size = pool.size() if hasattr(pool, "size") else 0
+    overflow = getattr(pool, "_max_overflow", 0)
+    return size + max(overflow, 0)
+
+
+def _pool_saturation(state: dict, sync_engine) -> float:
+    capacity = _pool_capacity(sync_engine)
+    return state["checked_out"] / capacity if capacity else 0.0
+
+
+registry.register(Gauge("db_pool_checked_out", "Connections checked out of the pool.",
+                        lambda: {(role,): state["checked_out"] for role, (state, _) in _pools.items()},
+                        ("engine",)))
+registry.register(Gauge("db_pool_capacity", "pool_size + max_overflow.",
+                        lambda: {(role,): _pool_capacity(eng) for role, (_, eng) in _pools.items()},
+                        ("engine",)))
+registry.register(Gauge("db_pool_saturation", "checked_out / capacity.",
+                        lambda: {(role,): _pool_saturation(state, eng) for role, (state, eng) in _pools.items()},
+                        ("engine",)))
+
+
+def instrument_engine(engine, role: str = "primary") -> None:
+    """Liga os eventos de SQL e de pool ao engine (async ou sync)."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    pool_state = {"checked_out": 0}
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        db_queries.inc(verb)
+        db_query_latency.observe(elapsed, verb)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+    @event.listens_for(sync_engine, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        pool_state["checked_out"] += 1
+
+    @event.listens_for(sync_engine, "checkin")
+    def _checkin(dbapi_conn, record):
+        pool_state["checked_out"] -= 1
+
+    # um engine recriado (mesmo role) substitui o anterior em vez de repetir a série
+    _pools[role] = (pool_state, sync_engine)
+
+
+class DecayingAverage:
+    """Média móvel exponencial que também decai com o tempo (sem amostras novas tende para 0)."""
+
+    def __init__(self, half_life: float):
+        self.half_life = half_life
+        self._value = 0.0
+        self._updated = time.monotonic()
+
+    def _decayed(self, now: float) -> float:
+        return self._value * math.pow(0.5, (now - self._updated) / self.half_life)
+
+    def observe(self, sample: float) -> None:
+        now = time.monotonic()
+        self._value = self._decayed(now) * 0.8 + sample * 0.2
+        self._updated = now
+
+    def value(self) -> float:
+        return self._decayed(time.monotonic())
+
+
+# sinal para o load shedding: espera recente por uma ligação do pool
+pool_wait_recent = DecayingAverage(half_life=5.0)
+registry.register(Gauge("db_pool_checkout_wait_recent_seconds", "Recent pool checkout wait (decaying average).",
+                        pool_wait_recent.value))
+
+
+# checkout wait: do_orm_execute corre antes de a sessão ir buscar ligação; after_begin logo depois
+@event.listens_for(Session, "do_orm_execute")
+def _session_execute(orm_execute_state):
+    session = orm_execute_state.session
+    if not session.in_transaction():
+        session.info["checkout_start"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_begin")
+def _session_begin(session, transaction, connection):
+    start = session.info.pop("checkout_start", None)
+    if start is None:
+        return
+    waited = time.perf_counter() - start
+    pool_wait_recent.observe(waited)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.pool_wait += waited
+
+
+# ---------- HTTP ----------
+def _route_label(scope: Scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if scope.get("endpoint") is not None:
+        # Mount (ex.: /static): agrupa tudo debaixo do prefixo
+        return scope.get("root_path", "") + "/{path}"
+    return "<unmatched>"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+        http_in_flight["value"] += 1
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight["value"] -= 1
+            _request_stats.reset(token)
+            route = _route_label(scope)
+            http_requests.inc(scope["method"], route, str(status_code))
+            http_latency.observe(time.perf_counter() - start, scope["method"], route)
+            db_queries_per_request.observe(stats.queries, route)
+            if stats.queries:
+                db_time_per_request.observe(stats.db_seconds, route)
+                db_pool_wait.observe(stats.pool_wait, route)
@@ -0,0 +1,122 @@
+from typing import Iterable
+
+from fastapi import status
+from fastapi.responses import RedirectResponse
+from jose import JWTError
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class PublicPathMatcher:
+    """Set de paths exatos + trie de prefixos por segmento, montado uma vez.
+
+    "/static" casa com "/static" e "/static/..." mas não com "/staticfoo",
+    tal como o antigo `path == pfx or path.startswith(pfx + "/")`.
+    """
+
+    _END = object()
+
+    def __init__(self, exact: Iterable[str], prefixes: Iterable[str]):
+        self.exact = frozenset(exact)
+        self._trie: dict = {}
+        for prefix in prefixes:
+            node = self._trie
+            for segment in prefix.strip("/").split("/"):
+                node = node.setdefault(segment, {})
+            node[self._END] = True
+
+    def __call__(self, path: str) -> bool:
+        if path in self.exact:
+            return True
+        node = self._trie
+        for segment in path.strip("/").split("/"):
+            node = node.get(segment)
+            if node is None:
+                return False
+            if self._END in node:
+                return True
+        return False
+
+
+class AuthGuardMiddleware:
+    """auth_guard em ASGI puro (sem BaseHTTPMiddleware).
+
+    Rotas públicas (static incluído) passam direto para a app. Nas outras,
+    valida o JWT (header Bearer ou cookie access_token) e põe o user em
+    scope["state"], que é o que `request.state.user` lê.
+    """
+
+    def __init__(self, app: ASGIApp, is_public, login_path: str, decode_token):
+        self.app = app
+        self.is_public = is_public
+        self.login_path = login_path
+        self.decode_token = decode_token
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+
+        # 1) Libera rotas públicas SEM QUALQUER VERIFICAÇÃO
+        if self.is_public(path):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        token = None
+        auth_header = headers.get("authorization")
+        if auth_header and auth_header.lower().startswith("bearer "):
+            token = auth_header.split(" ", 1)[1]
+        if not token:
+            token = cookie_parser(headers.get("cookie", "")).get("access_token")
+
+        if token:
+            # só o decode fica no try: um JWTError vindo da app (já com a resposta
+            # começada) não pode acabar num segundo redirect para o login
+            try:
+                payload = self.decode_token(token)
+            except JWTError:
+                payload = None
+            if payload is not None:
+                # sem claim id não há state.user: o get_current_user valida o token
+                # ele próprio (e responde 401), como antes
+                if payload.get("id") is not None:
+                    scope.setdefault("state", {})["user"] = {
+                        "id": payload["id"],
+                        "username": payload.get("sub"),
+                        "role": payload.get("role"),
+                        "exp": payload.get("exp"),
+                    }
+                await self.app(scope, receive, send)
+                return
+
+        # sem token / token inválido → login (proteção extra contra loop)
+        if path != self.login_path:
+            response = RedirectResponse(self.login_path, status_code=status.HTTP_303_SEE_OTHER)
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+class CompressionMiddleware:
+    """GZip das respostas dinâmicas (JSON, HTML, exports) acima de `minimum_size`.
+
+    Os prefixos em `skip_prefixes` ficam de fora: /static já traz as variantes
+    .br/.gz geradas no build e não vale a pena comprimir outra vez.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, compresslevel: int = 6,
+                 skip_prefixes: Iterable[str] = ()):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.skip = PublicPathMatcher((), skip_prefixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and not self.skip(scope["path"]):
+            await self.gzip(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import os
+from typing import Callable, NamedTuple
+
+import sqlalchemy as sa
+from sqlalchemy.exc import DBAPIError
+
+import models as md
+import todo_stats
+
+# sem isto, uma BD atrasada faz o arranque falhar (corre-se `python migrations.py` no deploy)
+SCHEMA_AUTO_MIGRATE = os.getenv("SCHEMA_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+# chave do pg_advisory_xact_lock: só um worker/réplica migra de cada vez
+MIGRATION_LOCK_KEY = 7_140_021
+
+_metadata = sa.MetaData()
+SCHEMA_VERSION = sa.Table(
+    "schema_version", _metadata,
+    sa.Column("version", sa.Integer, primary_key=True),
+    sa.Column("description", sa.String, nullable=False),
+    sa.Column("applied_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable  # upgrade(sync_connection), dentro da transação da migração
+
+
+def _create_extensions(conn) -> None:
+    if conn.dialect.name == "postgresql":
+        for extension in ("pg_trgm", "btree_gin"):
+            conn.exec_driver_sql(f"CREATE EXTENSION IF NOT EXISTS {extension}")
+
+
+# Todos os passos usam checkfirst/IF NOT EXISTS: numa BD criada pelo create_all antigo
+# só falta a tabela schema_version e isto apenas marca as versões.
+def _v1_tables(conn) -> None:
+    _create_extensions(conn)
+    for table in (md.Users.__table__, md.Todos.__table__):
+        table.create(conn, checkfirst=True)
+
+
+def _v2_indexes(conn) -> None:
+    _create_extensions(conn)
+    for index in md.Todos.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _v3_todo_stats(conn) -> None:
+    md.TodoStats.__table__.create(conn, checkfirst=True)
+    todo_stats.install_triggers(conn)
+
+
+MIGRATIONS = [
+    Migration(1, "users and todos tables", _v1_tables),
+    Migration(2, "keyset and full-text search indexes on todos", _v2_indexes),
+    Migration(3, "todo_stats summary table and triggers", _v3_todo_stats),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+async def current_version(engine) -> int:
+    """Versão do schema na BD (0 se nunca migrou). Uma só query: é o que corre em cada arranque."""
+    async with engine.connect() as conn:
+        try:
+            return await conn.scalar(sa.select(sa.func.max(SCHEMA_VERSION.c.version))) or 0
+        except DBAPIError:
+            # a tabela ainda não existe
+            return 0
+
+
+async def migrate(engine) -> list:
+    """Aplica as migrações em falta, todas numa transação. Devolve as versões aplicadas."""
+    applied = []
+    async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            await conn.execute(sa.text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        await conn.run_sync(lambda sync_conn: SCHEMA_VERSION.create(sync_conn, checkfirst=True))
+        # relido depois do lock: outro worker pode ter acabado de migrar
+        version = await conn.scalar(sa.select(sa.func.max(SCHEMA_VERSION.c.version))) or 0
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+            await conn.run_sync(migration.upgrade)
+            await conn.execute(sa.insert(SCHEMA_VERSION).values(
+                version=migration.version, description=migration.description,
+            ))
+            applied.append(migration.version)
+    return applied
+
+
+async def ensure_schema(engine) -> int:
+    """No arranque: confirma a versão e, se estiver atrasada, migra (ou falha, sem auto-migrate)."""
+    version = await current_version(engine)
+    if version >= LATEST_VERSION:
+        return version
+    if not SCHEMA_AUTO_MIGRATE:
+        raise RuntimeError(
+            f"Database schema is at version {version}, the app needs {LATEST_VERSION}: "
+            "run `python migrations.py`"
+        )
+    applied = await migrate(engine)
+    if applied:
+        print("SCHEMA MIGRATED:", ", ".join(str(v) for v in applied))
+    return LATEST_VERSION
+
+
+async def _main():
+    from database import dispose_engines, get_engine
+
+    parser = argparse.ArgumentParser(description="Aplica as migrações do schema em falta.")
+    parser.add_argument("--status", action="store_true", help="só mostra a versão atual")
+    args = parser.parse_args()
+    engine = get_engine()
+    try:
+        version = await current_version(engine)
+        print(f"schema version {version} (latest {LATEST_VERSION})")
+        if not args.status and version < LATEST_VERSION:
+            print("applied:", await migrate(engine))
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    # python migrations.py [--status]
+    asyncio.run(_main())
@@ -2,6 +2,7 @@ from pydantic import BaseModel
 from database import Base
 import sqlalchemy as sa
 import sqlalchemy as sa
+import sqlalchemy.dialects.postgresql  # noqa: F401  (regista o to_tsvector usado nos índices de pesquisa)
 from database import Base
 
 class Users(Base):
@@ -26,5 +27,45 @@ class Todos(Base):
     priority = sa.Column(sa.Integer)
     complete = sa.Column(sa.Boolean)
     owner_id = sa.Column(sa.Integer, sa.ForeignKey("users.id"))
-    
-    
+
+    # keyset pagination: (owner_id, [complete], [priority], id) cobre filtros + ORDER BY
+    __table_args__ = (
+        sa.Index("ix_todos_owner_id_id", "owner_id", "id"),
+        sa.Index("ix_todos_owner_priority_id", "owner_id", "priority", "id"),
+        sa.Index("ix_todos_owner_complete_priority_id", "owner_id", "complete", "priority", "id"),
+    )
+
+
+class TodoStats(Base):
+    """Contagens por (dono, prioridade, estado), mantidas por triggers em `todos` (ver todo_stats.py)."""
+    __tablename__ = "todo_stats"
+
+    # NULLs dos todos entram como 0 / false (não podem fazer parte da PK)
+    owner_id = sa.Column(sa.Integer, primary_key=True)
+    priority = sa.Column(sa.Integer, primary_key=True)
+    complete = sa.Column(sa.Boolean, primary_key=True)
+    count = sa.Column(sa.Integer, nullable=False, default=0)
+
+
+# ---------- pesquisa (só Postgres; em SQLite o search.py usa um fallback) ----------
+# as queries do search.py usam estas mesmas expressões, senão o planner não usa os índices
+TS_CONFIG = sa.literal_column("'simple'::regconfig")
+_EMPTY = sa.literal_column("''")
+TODO_SEARCH_DOCUMENT = (
+    sa.func.coalesce(Todos.title, _EMPTY).op("||")(sa.literal_column("' '"))
+    .op("||")(sa.func.coalesce(Todos.description, _EMPTY))
+)
+TODO_SEARCH_VECTOR = sa.func.to_tsvector(TS_CONFIG, TODO_SEARCH_DOCUMENT)
+TODO_SEARCH_LOWER = sa.func.lower(TODO_SEARCH_DOCUMENT)
+
+# precisam das extensões pg_trgm e btree_gin (criadas pelas migrações, ver migrations.py)
+# btree_gin: owner_id no mesmo GIN, a pesquisa de um user não depende do nº total de todos
+sa.Index(
+    "ix_todos_owner_search_tsv", Todos.owner_id, TODO_SEARCH_VECTOR.label("search_tsv"),
+    postgresql_using="gin",
+).ddl_if(dialect="postgresql")
+sa.Index(
+    "ix_todos_owner_search_trgm", Todos.owner_id, TODO_SEARCH_LOWER.label("search_lower"),
+    postgresql_using="gin", postgresql_ops={"search_lower": "gin_trgm_ops"},
+).ddl_if(dialect="postgresql")
+
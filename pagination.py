@@ -0,0 +1,122 @@
+import base64
+import json
+from enum import Enum
+from typing import Optional
+
+import sqlalchemy as sa
+from fastapi import HTTPException, Query, status
+
+import models as md
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class TodoSort(str, Enum):
+    id_asc = "id"
+    id_desc = "-id"
+    priority_asc = "priority"
+    priority_desc = "-priority"
+
+
+class TodoListParams:
+    """Query params partilhados pelas listas de todos (filtros + keyset)."""
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+        cursor: Optional[str] = Query(None),
+        sort: TodoSort = Query(TodoSort.id_asc),
+        complete: Optional[bool] = Query(None),
+        priority: Optional[int] = Query(None, gt=0, lt=10),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.sort = sort
+        self.complete = complete
+        self.priority = priority
+
+    def cache_key(self) -> str:
+        return f"{self.limit}:{self.cursor}:{self.sort.value}:{self.complete}:{self.priority}"
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        values = None
+    # a priority pode ser NULL (null no cursor); o id, sempre o último, nunca
+    if (not isinstance(values, list) or len(values) != size or not isinstance(values[-1], int)
+            or not all(v is None or isinstance(v, int) for v in values)):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
+
+
+def _sort_columns(sort: TodoSort):
+    if sort in (TodoSort.priority_asc, TodoSort.priority_desc):
+        return [md.Todos.priority, md.Todos.id]
+    return [md.Todos.id]
+
+
+def _priority_after(values: list, descending: bool):
+    """Keyset depois de (priority, id), com os NULL no fim em ASC e no início em DESC.
+
+    É a ordem por defeito do Postgres (o índice serve nos dois sentidos); o
+    SQLite faz o contrário, por isso o ORDER BY diz NULLS LAST/FIRST explicitamente.
+    Um tuplo com priority NULL compara a NULL, daí os IS NULL à parte.
+    """
+    priority, todo_id = values
+    col = md.Todos.priority
+    if priority is None:
+        if descending:
+            return sa.or_(col.is_not(None), sa.and_(col.is_(None), md.Todos.id < todo_id))
+        return sa.and_(col.is_(None), md.Todos.id > todo_id)
+    key = sa.tuple_(col, md.Todos.id)
+    bound = sa.tuple_(sa.literal(priority), sa.literal(todo_id))
+    if descending:
+        return key < bound
+    return sa.or_(key > bound, col.is_(None))
+
+
+def apply_todo_list(stmt, params: TodoListParams):
+    """Aplica filtros, ordenação e keyset (WHERE (cols) > cursor) a um select de Todos.
+
+    Vai buscar limit + 1 linhas para saber se existe página seguinte sem COUNT.
+    """
+    if params.complete is not None:
+        stmt = stmt.where(md.Todos.complete == params.complete)
+    if params.priority is not None:
+        stmt = stmt.where(md.Todos.priority == params.priority)
+
+    cols = _sort_columns(params.sort)
+    descending = params.sort.value.startswith("-")
+
+    if params.cursor:
+        values = decode_cursor(params.cursor, len(cols))
+        if len(cols) > 1:
+            stmt = stmt.where(_priority_after(values, descending))
+        else:
+            stmt = stmt.where(cols[0] < values[0] if descending else cols[0] > values[0])
+
+    if descending:
+        order = [c.desc().nulls_first() if c is md.Todos.priority else c.desc() for c in cols]
+    else:
+        order = [c.asc().nulls_last() if c is md.Todos.priority else c.asc() for c in cols]
+    return stmt.order_by(*order).limit(params.limit + 1)
+
+
+def split_page(rows: list, params: TodoListParams):
+    """Devolve (linhas da página, cursor seguinte ou None)."""
+    if len(rows) <= params.limit:
+        return rows, None
+    rows = rows[:params.limit]
+    last = rows[-1]
+    cols = _sort_columns(params.sort)
+    return rows, encode_cursor([getattr(last, c.key) for c in cols])
@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import hmac
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from routers.auth import SECRET_KEY
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_BUFFER = int(os.getenv("PROFILE_BUFFER", "50"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.002"))
+PROFILE_MAX_DEPTH = 64
+PROFILE_TOP_STACKS = 50
+
+
+class StackSampler(threading.Thread):
+    """Amostra a stack da thread do event loop a cada `interval` segundos.
+
+    Num event loop os outros pedidos correm na mesma thread, por isso as
+    amostras de pedidos concorrentes também podem aparecer no perfil.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True, name="profile-sampler")
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self) -> Counter:
+        self._stop_event.set()
+        self.join()
+        return self.samples
+
+
+class RequestProfile:
+    def __init__(self, profile_id: int, method: str, path: str, reason: str):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.status = None
+        self.sql: list[dict] = []
+        self.stacks: Counter = Counter()
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "sql_count": len(self.sql),
+            "sql_ms": round(sum(q["duration_ms"] for q in self.sql), 3),
+            "samples": sum(self.stacks.values()),
+        }
+
+    def detail(self) -> dict:
+        return {
+            **self.summary(),
+            "sql": self.sql,
+            # formato "folded" (flamegraph.pl / speedscope): "a;b;c" -> nº de amostras
+            "stacks": dict(self.stacks.most_common(PROFILE_TOP_STACKS)),
+        }
+
+
+_active: ContextVar[Optional[RequestProfile]] = ContextVar("active_profile", default=None)
+
+
+class Profiler:
+    """Perfis a pedido: header assinado ou "armar" os próximos N pedidos num prefixo."""
+
+    def __init__(self, secret: str, buffer_size: int, interval: float):
+        self._secret = secret.encode()
+        self.interval = interval
+        self.profiles: deque = deque(maxlen=buffer_size)
+        self._ids = itertools.count(1)
+        self.armed_prefix: Optional[str] = None
+        self.armed_remaining = 0
+
+    # ---------- ativação ----------
+    def sign(self, ttl_seconds: int) -> str:
+        expires = int(time.time()) + ttl_seconds
+        mac = hmac.new(self._secret, f"profile:{expires}".encode(), hashlib.sha256).hexdigest()
+        return f"{expires}.{mac}"
+
+    def verify(self, value: str) -> bool:
+        expires, _, mac = value.partition(".")
+        if not expires.isdigit() or int(expires) < time.time():
+            return False
+        expected = hmac.new(self._secret, f"profile:{expires}".encode(), hashlib.sha256).hexdigest()
+        return hmac.compare_digest(mac, expected)
+
+    def arm(self, path_prefix: str, count: int) -> None:
+        self.armed_prefix = path_prefix
+        self.armed_remaining = count
+
+    def disarm(self) -> None:
+        self.armed_prefix = None
+        self.armed_remaining = 0
+
+    def _take_armed(self, path: str) -> bool:
+        if self.armed_remaining > 0 and path.startswith(self.armed_prefix):
+            self.armed_remaining -= 1
+            return True
+        return False
+
+    # ---------- buffer ----------
+    def recent(self) -> list[dict]:
+        return [p.summary() for p in reversed(self.profiles)]
+
+    def get(self, profile_id: int) -> Optional[RequestProfile]:
+        return next((p for p in self.profiles if p.id == profile_id), None)
+
+    def status(self) -> dict:
+        return {
+            "armed_prefix": self.armed_prefix,
+            "armed_remaining": self.armed_remaining,
+            "buffer_size": self.profiles.maxlen,
+            "stored": len(self.profiles),
+            "interval": self.interval,
+        }
+
+    def reason_for(self, scope: Scope) -> Optional[str]:
+        if self.armed_remaining and self._take_armed(scope["path"]):
+            return "armed"
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return "header" if self.verify(value.decode("latin-1")) else None
+        return None
+
+    def new_profile(self, scope: Scope, reason: str) -> RequestProfile:
+        return RequestProfile(next(self._ids), scope["method"], scope["path"], reason)
+
+
+def instrument_engine(engine) -> None:
+    """Regista cada statement SQL (e a duração) no perfil ativo, se houver."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _active.get() is not None:
+            conn.info["profile_start"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        profile = _active.get()
+        start = conn.info.pop("profile_start", None)
+        if profile is not None and start is not None:
+            profile.sql.append({
+                "statement": statement,
+                "executemany": executemany,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+            })
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        reason = self.profiler.reason_for(scope)
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = self.profiler.new_profile(scope, reason)
+        token = _active.set(profile)
+        sampler = StackSampler(threading.get_ident(), self.profiler.interval)
+        sampler.start()
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.duration = time.perf_counter() - start
+            # o join espera até um intervalo pela thread: fora do event loop, senão
+            # parava todos os pedidos concorrentes a cada pedido com perfil
+            profile.stacks = await asyncio.to_thread(sampler.stop)
+            _active.reset(token)
+            self.profiler.profiles.append(profile)
+
+
+profiler = Profiler(SECRET_KEY, PROFILE_BUFFER, PROFILE_INTERVAL)
@@ -0,0 +1,306 @@
+import json
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from metrics import pool_wait_recent
+from middleware import PublicPathMatcher
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# nº de proxies à frente da app (Koyeb/nginx): o IP do cliente é o X-Forwarded-For[-hops]
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+SHED_MAX_IN_FLIGHT = int(os.getenv("SHED_MAX_IN_FLIGHT", "200"))
+SHED_MAX_POOL_WAIT = float(os.getenv("SHED_MAX_POOL_WAIT", "0.5"))
+SHED_RETRY_AFTER = os.getenv("SHED_RETRY_AFTER", "2")
+
+_PERIODS = {"s": 1, "sec": 1, "min": 60, "h": 3600}
+_RULE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*/\s*(s|sec|min|h)\s*(?::\s*(\d+))?\s*$")
+
+
+class Rule:
+    """Token bucket: `rate` tokens/s, até `burst` de reserva. Texto: "5/min:10" (burst opcional)."""
+
+    __slots__ = ("rate", "burst", "text")
+
+    def __init__(self, text: str):
+        match = _RULE.match(text)
+        if match is None:
+            raise ValueError(f"bad rate limit rule {text!r}, expected e.g. '5/min:10'")
+        amount, period, burst = match.groups()
+        self.rate = float(amount) / _PERIODS[period]
+        self.burst = int(burst) if burst else max(1, math.ceil(float(amount)))
+        self.text = text
+
+
+# "MÉTODO /prefixo" -> regra; o prefixo mais comprido ganha, "*" casa qualquer método
+DEFAULT_RULES = {
+    "POST /auth/token": "10/min:10",        # bcrypt, por IP
+    "POST /auth/login": "10/min:10",
+    "POST /auth/create": "5/min:5",
+    "GET /todos/get-all": "10/s:30",
+    "GET /todos/search": "5/s:20",
+    "GET /todos/export": "6/min:3",
+    "GET /admin/todo/export": "6/min:3",
+    "POST /todos/batch": "2/s:5",
+    "* /": "30/s:60",                       # resto, por user (ou IP se anónimo)
+}
+
+
+def load_rules() -> dict:
+    rules = dict(DEFAULT_RULES)
+    rules.update(json.loads(os.getenv("RATE_LIMIT_RULES", "{}")))  # ex.: {"GET /todos/get-all": "20/s:40"}
+    return rules
+
+
+class RouteRules:
+    def __init__(self, rules: dict):
+        parsed = []
+        for key, text in rules.items():
+            method, _, prefix = key.partition(" ")
+            parsed.append((method.upper(), prefix.rstrip("/") or "/", Rule(text), key))
+        # mais específico primeiro
+        self._rules = sorted(parsed, key=lambda r: (len(r[1]), r[0] != "*"), reverse=True)
+
+    def match(self, method: str, path: str):
+        for rule_method, prefix, rule, key in self._rules:
+            if rule_method not in ("*", method):
+                continue
+            if prefix == "/" or path == prefix or path.startswith(prefix + "/"):
+                return key, rule
+        return None, None
+
+
+# ---------- backends ----------
+class MemoryRateLimitBackend:
+    """Buckets em processo (default), LRU limitada a `max_keys`."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+
+    @staticmethod
+    def _take(state, now: float, rule: Rule, cost: float):
+        tokens, updated = state if state is not None else (rule.burst, now)
+        tokens = min(rule.burst, tokens + (now - updated) * rule.rate)
+        if tokens >= cost:
+            return (tokens - cost, now), True, 0.0
+        return (tokens, now), False, (cost - tokens) / rule.rate
+
+    async def take(self, key: str, rule: Rule, cost: float = 1.0) -> tuple[bool, float]:
+        state, allowed, retry_after = self._take(self._buckets.get(key), self.clock(), rule, cost)
+        self._buckets[key] = state
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)  # bucket esquecido = volta cheio (falha para o lado permissivo)
+        return allowed, retry_after
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+
+class FakeSharedRateLimitBackend(MemoryRateLimitBackend):
+    """Fake local do backend partilhado: estado em JSON, como ficaria no Redis."""
+
+    async def take(self, key: str, rule: Rule, cost: float = 1.0) -> tuple[bool, float]:
+        raw = self._buckets.get(key)
+        state = tuple(json.loads(raw)) if raw is not None else None
+        state, allowed, retry_after = self._take(state, self.clock(), rule, cost)
+        self._buckets[key] = json.dumps(state)
+        return allowed, retry_after
+
+
+_REDIS_TAKE = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local allowed, retry = 0, 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(retry)}
+"""
+
+
+class RedisRateLimitBackend:
+    """Buckets partilhados entre workers/instâncias (precisa do pacote `redis`)."""
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the 'redis' package") from e
+        self._redis = aioredis.from_url(url)
+        self._script = self._redis.register_script(_REDIS_TAKE)
+
+    async def take(self, key: str, rule: Rule, cost: float = 1.0) -> tuple[bool, float]:
+        try:
+            allowed, retry_after = await self._script(keys=[f"rl:{key}"], args=[rule.rate, rule.burst, cost])
+        except Exception as e:
+            # Redis em baixo não pode deitar a app abaixo: deixa passar
+            print("RATE_LIMIT ERROR:", type(e).__name__, str(e))
+            return True, 0.0
+        return bool(int(allowed)), float(retry_after)
+
+    def size(self) -> int:
+        return -1
+
+
+# ---------- limiter / shedder ----------
+def client_ip(scope: Scope, trusted_hops: int = TRUSTED_PROXY_HOPS) -> str:
+    if trusted_hops > 0:
+        forwarded = Headers(scope=scope).get("x-forwarded-for")
+        if forwarded:
+            hops = [h.strip() for h in forwarded.split(",") if h.strip()]
+            if hops:
+                return hops[-min(trusted_hops, len(hops))]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class RateLimiter:
+    def __init__(self, backend, rules: RouteRules):
+        self.backend = backend
+        self.rules = rules
+        self.allowed = 0
+        self.limited = 0
+
+    async def check(self, scope: Scope) -> Optional[float]:
+        """None se pode passar; senão os segundos até haver token."""
+        rule_key, rule = self.rules.match(scope["method"], scope["path"])
+        if rule is None:
+            return None
+        user = scope.get("state", {}).get("user")
+        who = f"u:{user['id']}" if user and user.get("id") is not None else f"ip:{client_ip(scope)}"
+        allowed, retry_after = await self.backend.take(f"{rule_key}|{who}", rule)
+        if allowed:
+            self.allowed += 1
+            return None
+        self.limited += 1
+        return retry_after
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "keys": self.backend.size(),
+        }
+
+
+class LoadShedder:
+    """503 quando este worker já tem pedidos demais em curso ou o pool de BD está a fazer fila."""
+
+    def __init__(self, max_in_flight: int, max_pool_wait: float, pool_wait: Callable[[], float]):
+        self.max_in_flight = max_in_flight
+        self.max_pool_wait = max_pool_wait
+        self.pool_wait = pool_wait
+        self.in_flight = 0
+        self.shed_in_flight = 0
+        self.shed_pool_wait = 0
+
+    def reason(self) -> Optional[str]:
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            self.shed_in_flight += 1
+            return "in_flight"
+        if self.max_pool_wait and self.pool_wait() > self.max_pool_wait:
+            self.shed_pool_wait += 1
+            return "pool_wait"
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "pool_wait_recent": self.pool_wait(),
+            "max_pool_wait": self.max_pool_wait,
+            "shed_in_flight": self.shed_in_flight,
+            "shed_pool_wait": self.shed_pool_wait,
+        }
+
+
+class LoadShedMiddleware:
+    """Por fora do auth_guard: recusa barato, antes de decodificar tokens ou tocar na BD.
+
+    `skip_prefixes` nem são verificados nem contados (/static, /metrics); os
+    `long_lived_prefixes` (SSE) são verificados ao ligar mas não contam como em curso.
+    """
+
+    def __init__(self, app: ASGIApp, shedder: LoadShedder, skip_prefixes: Iterable[str] = (),
+                 long_lived_prefixes: Iterable[str] = ()):
+        self.app = app
+        self.shedder = shedder
+        self.skip = PublicPathMatcher((), skip_prefixes)
+        self.long_lived = PublicPathMatcher((), long_lived_prefixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.skip(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        reason = self.shedder.reason()
+        if reason is not None:
+            response = JSONResponse({"detail": "Server busy, try again"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                    headers={"Retry-After": SHED_RETRY_AFTER, "X-Shed-Reason": reason})
+            await response(scope, receive, send)
+            return
+        if self.long_lived(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        self.shedder.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.shedder.in_flight -= 1
+
+
+class RateLimitMiddleware:
+    """Por dentro do auth_guard: já há scope["state"]["user"] para chavear por user."""
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter, skip_prefixes: Iterable[str] = ()):
+        self.app = app
+        self.limiter = limiter
+        self.skip = PublicPathMatcher((), skip_prefixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.skip(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        retry_after = await self.limiter.check(scope)
+        if retry_after is not None:
+            response = JSONResponse({"detail": "Too Many Requests"}, status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+def _make_backend():
+    kind = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    if kind == "redis":
+        return RedisRateLimitBackend(os.getenv("RATE_LIMIT_URL", "redis://localhost:6379/1"))
+    if kind == "fake":
+        return FakeSharedRateLimitBackend()
+    return MemoryRateLimitBackend()
+
+
+rate_limiter = RateLimiter(_make_backend(), RouteRules(load_rules()))
+load_shedder = LoadShedder(SHED_MAX_IN_FLIGHT, SHED_MAX_POOL_WAIT, pool_wait_recent.value)
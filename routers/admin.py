@@ -1,33 +1,61 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, Path, status
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from database import AsyncSessionLocal
+from sqlalchemy import select, delete
+from database import get_db, get_read_db
 import models as md
-from schema import TodoRequest
+from schema import TodoRequest, TodoResponse, TodoStatsResponse
+from pagination import TodoListParams, apply_todo_list, split_page, NEXT_CURSOR_HEADER
+from export import ExportFormat, EXPORT_COLUMNS, stream_todos
 from .auth import get_current_user
+from token_cache import token_cache
+from security import password_hasher
+from todo_cache import todo_cache, todo_to_dict, TODO_COLUMNS
+from events import event_bus
+from todo_stats import read_groups, rebuild_stats, summarize
+from profiling import profiler
+from ratelimit import load_shedder, rate_limiter
+from write_behind import write_behind
 
 router = APIRouter(
     prefix="/admin",
     tags=["admin"]
 )
 
-async def get_db():
-    async with AsyncSessionLocal() as session:
-        yield session
-
-
 db_dependency = Annotated[AsyncSession, Depends(get_db)]
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
+list_params_dependency = Annotated[TodoListParams, Depends()]
+
+@router.get("/todo", status_code=status.HTTP_200_OK, response_model=list[TodoResponse])
+async def read_all(user: user_dependency, db: read_db_dependency, response: Response,
+                   params: list_params_dependency, owner_id: Optional[int] = Query(None, gt=0)):
+    
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="ONLY ADMIN PAGE... UNHOUTORIZED LOGIN")
+    
+    await write_behind.flush_pending(owner_id)
+    stmt = select(*TODO_COLUMNS)
+    if owner_id is not None:
+        stmt = stmt.where(md.Todos.owner_id == owner_id)
+    result = await db.execute(apply_todo_list(stmt, params))
+    todos, next_cursor = split_page(result.all(), params)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return [todo_to_dict(t) for t in todos]
 
-@router.get("/todo", status_code=status.HTTP_200_OK)
-async def read_all(user: user_dependency, db: db_dependency):
+@router.get("/todo/export", status_code=status.HTTP_200_OK)
+async def export_all(user: user_dependency, format: ExportFormat = ExportFormat.ndjson,
+                     owner_id: Optional[int] = Query(None, gt=0)):
     
     if user is None or user.get('role') != 'admin':
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="ONLY ADMIN PAGE... UNHOUTORIZED LOGIN")
     
-    result = await db.execute(select(md.Todos))
-    return result.scalars().all()
+    await write_behind.flush_pending(owner_id)
+    stmt = select(*EXPORT_COLUMNS).order_by(md.Todos.id)
+    if owner_id is not None:
+        stmt = stmt.where(md.Todos.owner_id == owner_id)
+    return stream_todos(stmt, format, "todos-all" if owner_id is None else f"todos-{owner_id}")
 
 @router.delete("/todo/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_todo_by_id(user: user_dependency, db: db_dependency, todo_id: int):
@@ -35,11 +63,141 @@ async def delete_todo_by_id(user: user_dependency, db: db_dependency, todo_id: i
     if user is None or user.get('role') != 'admin':
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="ONLY ADMIN PAGE... UNHOUTORIZED LOGIN")
     
-    result = await db.execute(select(md.Todos).where(md.Todos.id == todo_id))
-    result_scalar = result.scalar_one_or_none()
+    # DELETE ... RETURNING owner_id: apaga e diz de quem era (para invalidar a cache) numa só ida
+    result = await db.execute(
+        delete(md.Todos.__table__).where(md.Todos.id == todo_id).returning(md.Todos.owner_id)
+    )
+    deleted = result.one_or_none()
     
-    if result_scalar is None:
+    if deleted is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND TOOD")
     
-    await db.delete(result_scalar)
     await db.commit()
+    write_behind.discard([todo_id])
+    await todo_cache.invalidate(deleted.owner_id)
+    await event_bus.publish(deleted.owner_id, "todo.deleted", {"id": todo_id})
+
+
+@router.get("/stats", status_code=status.HTTP_200_OK, response_model=TodoStatsResponse)
+async def read_stats(user: user_dependency, db: read_db_dependency, owner_id: Optional[int] = Query(None, gt=0)):
+    
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="ONLY ADMIN PAGE... UNHOUTORIZED LOGIN")
+    
+    await write_behind.flush_pending(owner_id)
+    return summarize(await read_groups(db, owner_id))
+
+@router.post("/stats/rebuild", status_code=status.HTTP_200_OK)
+async def rebuild_todo_stats(user: user_dependency, db: db_dependency, owner_id: Optional[int] = Query(None, gt=0)):
+    
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="ONLY ADMIN PAGE... UNHOUTORIZED LOGIN")
+    
+    try:
+        await write_behind.flush_pending(owner_id)
+        return await rebuild_stats(db, owner_id)
+    except Exception as e:
+        await db.rollback()
+        print("REBUILD_STATS ERROR:", type(e).__name__, str(e))
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="ERROR 500")
+
+
+@router.get("/token-cache", status_code=status.HTTP_200_OK)
+async def read_token_cache_stats(user: user_dependency):
+    
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="ONLY ADMIN PAGE... UNHOUTORIZED LOGIN")
+    
+    return token_cache.stats()
+
+
+@router.get("/password-hasher", status_code=status.HTTP_200_OK)
+async def read_password_hasher_stats(user: user_dependency):
+    
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="ONLY ADMIN PAGE... UNHOUTORIZED LOGIN")
+    
+    return password_hasher.stats()
+
+
+@router.get("/todo-cache", status_code=status.HTTP_200_OK)
+async def read_todo_cache_stats(user: user_dependency):
+    
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="ONLY ADMIN PAGE... UNHOUTORIZED LOGIN")
+    
+    return todo_cache.stats()
+
+@router.get("/rate-limit", status_code=status.HTTP_200_OK)
+async def read_rate_limit_stats(user: user_dependency):
+    
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="ONLY ADMIN PAGE... UNHOUTORIZED LOGIN")
+    
+    return {"rate_limit": rate_limiter.stats(), "load_shed": load_shedder.stats()}
+
+@router.get("/events", status_code=status.HTTP_200_OK)
+async def read_event_stats(user: user_dependency):
+    
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="ONLY ADMIN PAGE... UNHOUTORIZED LOGIN")
+    
+    return event_bus.stats()
+
+
+@router.get("/write-behind", status_code=status.HTTP_200_OK)
+async def read_write_behind_stats(user: user_dependency):
+    
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="ONLY ADMIN PAGE... UNHOUTORIZED LOGIN")
+    
+    return write_behind.stats()
+
+
+### Profiling ###
+@router.post("/profiling/token", status_code=status.HTTP_200_OK)
+async def create_profiling_token(user: user_dependency, ttl: int = Query(300, gt=0, le=3600)):
+    
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="ONLY ADMIN PAGE... UNHOUTORIZED LOGIN")
+    
+    # enviar como header "X-Profile: <value>" em cada pedido a perfilar
+    return {"header": "X-Profile", "value": profiler.sign(ttl), "expires_in": ttl}
+
+@router.post("/profiling/arm", status_code=status.HTTP_200_OK)
+async def arm_profiling(user: user_dependency, path_prefix: str = Query("/", min_length=1),
+                        count: int = Query(1, gt=0, le=1000)):
+    
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="ONLY ADMIN PAGE... UNHOUTORIZED LOGIN")
+    
+    profiler.arm(path_prefix, count)
+    return profiler.status()
+
+@router.delete("/profiling/arm", status_code=status.HTTP_200_OK)
+async def disarm_profiling(user: user_dependency):
+    
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="ONLY ADMIN PAGE... UNHOUTORIZED LOGIN")
+    
+    profiler.disarm()
+    return profiler.status()
+
+@router.get("/profiling", status_code=status.HTTP_200_OK)
+async def list_profiles(user: user_dependency):
+    
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="ONLY ADMIN PAGE... UNHOUTORIZED LOGIN")
+    
+    return {**profiler.status(), "profiles": profiler.recent()}
+
+@router.get("/profiling/{profile_id}", status_code=status.HTTP_200_OK)
+async def read_profile(user: user_dependency, profile_id: int = Path(gt=0)):
+    
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="ONLY ADMIN PAGE... UNHOUTORIZED LOGIN")
+    
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="PROFILE NOT FOUND")
+    return profile.detail()
@@ -3,22 +3,21 @@ from pathlib import Path
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, Response, status, Request, Form
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.templating import Jinja2Templates
 from fastapi.responses import RedirectResponse
 from pydantic import BaseModel
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 
 from database import get_db
 from models import Users
+from token_cache import token_cache
+from schema import CurrentUserResponse, UserResponse
+from security import hash_password, verify_password
 
-# templates portável (evita hardcode)
-BASE_DIR = Path(__file__).resolve().parents[1]
-templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
-
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+from templating import templates
 
 logout_on = False
 
@@ -60,10 +59,7 @@ async def authenticate_user(username: str, password: str, db: AsyncSession):
     user = result.scalars().first()
     if not user:
         return False
-    try:
-        ok = bcrypt_context.verify(password, user.hashed_password or "")
-    except Exception:
-        ok = False
+    ok = await verify_password(password, user.hashed_password or "")
     return user if ok else False
 
 def create_access_token(username: str, user_id: int, role: str, expires_delta: timedelta):
@@ -71,11 +67,24 @@ def create_access_token(username: str, user_id: int, role: str, expires_delta: t
     payload = {'sub': username, 'id': user_id, 'role': role, 'exp': datetime.utcnow() + expires_delta}
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
+def decode_token(token: str) -> dict:
+    # verifica o HMAC uma vez por token; depois vem da cache até ao exp
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        token_cache.put(token, claims)
+    return claims
+
 # ---------- CURRENT USER ----------
 async def get_current_user(
     request: Request,
     token: Annotated[Optional[str], Depends(oauth2_bearer)],
 ):
+    # o auth_guard já validou o token deste pedido
+    state_user = getattr(request.state, "user", None)
+    if state_user and state_user.get("id") is not None and state_user.get("username") is not None:
+        return {'username': state_user["username"], 'id': state_user["id"], 'role': state_user.get("role")}
+
     # tenta Authorization header; senão, tenta cookie
     if not token:
         token = request.cookies.get("access_token")
@@ -86,7 +95,7 @@ async def get_current_user(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         username: str = payload.get('sub')
         user_id: int = payload.get('id')
         role: str = payload.get('role')
@@ -105,34 +114,48 @@ async def get_current_user_silent(
     except HTTPException:
         return None
 
-@router.get("/me")
+@router.get("/me", response_model=CurrentUserResponse)
 async def get_logged_user(current_user: dict = Depends(get_current_user)):
     return current_user
 
+def _dialect_insert(db: AsyncSession):
+    # insert() com on_conflict_do_nothing existe por dialeto (Postgres em produção, SQLite em local)
+    if db.bind.dialect.name == "sqlite":
+        return sqlite_insert
+    return pg_insert
+
 # ---------- API: CRIAR USER (JSON) ----------
-@router.post("/create", status_code=status.HTTP_201_CREATED, name="create_user")
+@router.post("/create", status_code=status.HTTP_201_CREATED, name="create_user", response_model=UserResponse)
 async def create_user(payload: CreateUserRequest, db: AsyncSession = Depends(get_db)):
-    existing_email = await db.execute(select(Users).where(Users.email == payload.email))
-    if existing_email.scalar_one_or_none():
-        raise HTTPException(status_code=400, detail="Email já registado")
-
-    existing_username = await db.execute(select(Users).where(Users.username == payload.username))
-    if existing_username.scalar_one_or_none():
-        raise HTTPException(status_code=400, detail="Username já registado")
-
-    user = Users(
+    values = dict(
         email=payload.email,
         username=payload.username,
         first_name=payload.first_name,
         last_name=payload.last_name,
         role=payload.role,
-        hashed_password=bcrypt_context.hash(payload.password),
+        hashed_password=await hash_password(payload.password),
         is_active=True,
     )
-    db.add(user)
+    # INSERT ... ON CONFLICT DO NOTHING RETURNING: uma só ida à BD no caso normal
+    users_table = Users.__table__
+    stmt = (
+        _dialect_insert(db)(users_table)
+        .values(**values)
+        .on_conflict_do_nothing()
+        .returning(users_table.c.id, users_table.c.username, users_table.c.email,
+                   users_table.c.role, users_table.c.is_active)
+    )
+    created = (await db.execute(stmt)).one_or_none()
+    if created is None:
+        # conflito: só aqui se vai ver qual dos dois já existe
+        await db.rollback()
+        existing_email = await db.execute(select(Users.id).where(Users.email == payload.email))
+        if existing_email.first():
+            raise HTTPException(status_code=400, detail="Email já registado")
+        raise HTTPException(status_code=400, detail="Username já registado")
+
     await db.commit()
-    await db.refresh(user)
-    return {"id": user.id, "username": user.username, "email": user.email, "role": user.role, "is_active": user.is_active}
+    return dict(created._mapping)
 
 # ---------- API: TOKEN PARA APPS (x-www-form-urlencoded) ----------
 @router.post("/token", response_model=Token)
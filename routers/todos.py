@@ -1,103 +1,230 @@
-from typing import Annotated
-from fastapi import APIRouter, Request
+from typing import Annotated, Optional
+from fastapi import APIRouter, Request, Response
 from fastapi import Depends, HTTPException, Path, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from database import AsyncSessionLocal
+from sqlalchemy import select, insert, update, delete, bindparam
+from database import get_db, get_read_db
 import models as md
-from schema import TodoRequest
+from schema import TodoRequest, TodoBatchRequest, TodoResponse, TodoSearchResult, TodoStatsResponse
+from pagination import TodoListParams, apply_todo_list, split_page, NEXT_CURSOR_HEADER
+from export import ExportFormat, EXPORT_COLUMNS, stream_todos
+from todo_cache import todo_cache, todo_to_dict, TODO_COLUMNS
+from events import event_bus, sse_stream
+from search import TodoSearchParams, search_todos
+from todo_stats import read_groups, summarize
+from write_behind import write_behind
+from conditional import make_etag, not_modified, not_modified_response, set_validators
 from .auth import get_current_user
-from starlette.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
-import pathlib
-
-
-BASE_DIR = pathlib.Path(__file__).resolve().parents[1]
-templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
+from starlette.background import BackgroundTask
+from starlette.responses import RedirectResponse, StreamingResponse
+from templating import templates
 
 router = APIRouter(
     prefix="/todos",
     tags=['todos']
 )
 
-async def get_db():
-    async with AsyncSessionLocal() as session:
-        yield session
-        
-        
 user_dependency = Annotated[dict, Depends(get_current_user)]
+list_params_dependency = Annotated[TodoListParams, Depends()]
+search_params_dependency = Annotated[TodoSearchParams, Depends()]
+
+
+async def load_user_todos(db: AsyncSession, user_id: int, params: TodoListParams) -> dict:
+    """Página de todos do utilizador, via todo_cache (invalidada em cada escrita)."""
+    # filtros/ordem dependem dos valores: os updates em write-behind deste user vão antes
+    await write_behind.flush_pending(user_id)
+
+    async def loader():
+        # só colunas (Row), sem hidratar entidades ORM nem identity map
+        result = await db.execute(apply_todo_list(select(*TODO_COLUMNS).where(md.Todos.owner_id == user_id), params))
+        todos, next_cursor = split_page(result.all(), params)
+        return {"todos": [todo_to_dict(t) for t in todos], "next_cursor": next_cursor}
+
+    return await todo_cache.get_or_load(user_id, f"list:{params.cache_key()}", loader)
 
 ### Pages ###
 @router.get("/todo-page", name="todos_page")
 async def render_todo_page(
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    params: list_params_dependency,
+    db: AsyncSession = Depends(get_read_db),
 ):
     user = getattr(request.state, "user", None)
     if not user:
         return RedirectResponse("/auth/login-page", status_code=303)
     
-    result = await db.execute(
-        select(md.Todos).where(md.Todos.owner_id == user["id"])   # confere o nome da coluna!
-    )
-    todos = result.scalars().all()
-    
-    if not user:
-        return RedirectResponse("/auth/login-page", status_code=status.HTTP_303_SEE_OTHER)
+    page = await load_user_todos(db, user["id"], params)
     
-    return templates.TemplateResponse("todo.html", {"request": request, "user": user, "todos": todos})
+    return templates.TemplateResponse("todo.html", {"request": request, "user": user, "todos": page["todos"], "next_cursor": page["next_cursor"]})
+
+
+### Partials (fragmentos HTML para trocar sem recarregar a página) ###
+@router.get("/partials/list", name="todos_partial_list")
+async def render_todo_list_partial(
+    request: Request,
+    user: user_dependency,
+    params: list_params_dependency,
+    db: AsyncSession = Depends(get_read_db),
+):
+    page = await load_user_todos(db, user["id"], params)
+    return templates.TemplateResponse("partials/todo_board.html", {"request": request, "todos": page["todos"], "next_cursor": page["next_cursor"]})
+
+@router.get("/partials/row/{todo_id}", name="todos_partial_row")
+async def render_todo_row_partial(
+    request: Request,
+    user: user_dependency,
+    todo_id: int = Path(gt=0),
+    db: AsyncSession = Depends(get_read_db),
+):
+    async def loader():
+        result = await db.execute(select(*TODO_COLUMNS).where(md.Todos.id == todo_id, md.Todos.owner_id == user["id"]))
+        todo = result.one_or_none()
+        return todo_to_dict(todo) if todo is not None else None
+
+    # mesma chave que o get-todo-id (lá também só se guardam todos do próprio user)
+    task = write_behind.overlay(await todo_cache.get_or_load(user["id"], f"todo:{todo_id}", loader))
+    if task is None or task["owner_id"] != user["id"]:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo Not found")
+    return templates.TemplateResponse("partials/todo_item.html", {"request": request, "task": task})
 
 
 ### Endpoints ###
-@router.get("/", status_code=status.HTTP_200_OK)
-async def read_all(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(md.Todos))
-    return result.scalars().all()
+@router.get("/events", name="todos_events")
+async def todo_events(request: Request, user: user_dependency):
+    """Server-Sent Events com as alterações aos todos do user (todos os tabs/dispositivos)."""
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not logged in")
 
-@router.get("/get-all", status_code=status.HTTP_200_OK)
-async def read_all_todos_from_user_id(user: user_dependency, db: AsyncSession = Depends(get_db)):
+    sub = event_bus.subscribe(user["id"])
+    if sub is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many event streams",
+                            headers={"Retry-After": "30"})
+    # o stream fecha quando o token expira; o EventSource volta a ligar e passa outra vez pelo auth_guard
+    expires_at = (getattr(request.state, "user", None) or {}).get("exp")
+    return StreamingResponse(
+        sse_stream(event_bus, sub, expires_at),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(event_bus.unsubscribe, sub),
+    )
+
+@router.get("/", status_code=status.HTTP_200_OK, response_model=list[TodoResponse])
+async def read_all(response: Response, params: list_params_dependency, db: AsyncSession = Depends(get_read_db)):
+    await write_behind.flush_pending()
+    result = await db.execute(apply_todo_list(select(*TODO_COLUMNS), params))
+    todos, next_cursor = split_page(result.all(), params)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return [todo_to_dict(t) for t in todos]
+
+@router.get("/get-all", status_code=status.HTTP_200_OK, response_model=list[TodoResponse])
+async def read_all_todos_from_user_id(user: user_dependency, request: Request, response: Response, params: list_params_dependency, db: AsyncSession = Depends(get_read_db)):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not logged in")
     
-    result = await db.execute(select(md.Todos).where(md.Todos.owner_id == user.get("id")))
-    todos_scalar = result.scalars().all()
+    # GET condicional: 304 só com a versão do user, sem query nem serialização
+    # (só com cache partilhada, ver TodoCache.version)
+    generation, mtime = await todo_cache.version(user.get("id"))
+    etag = make_etag(user.get("id"), generation, f"list:{params.cache_key()}") if generation is not None else None
+    if etag and not_modified(request, etag):
+        return not_modified_response(etag, mtime)
+
+    page = await load_user_todos(db, user.get("id"), params)
+    if etag:
+        set_validators(response, etag, mtime)
+    if page["next_cursor"]:
+        response.headers[NEXT_CURSOR_HEADER] = page["next_cursor"]
+
+    return page["todos"]
+
+@router.get("/search", status_code=status.HTTP_200_OK, response_model=list[TodoSearchResult])
+async def search_todos_from_user_id(user: user_dependency, response: Response, params: search_params_dependency,
+                                    db: AsyncSession = Depends(get_read_db)):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not logged in")
+
+    await write_behind.flush_pending(user.get("id"))
+
+    async def loader():
+        return await search_todos(db, user.get("id"), params)
+
+    page = await todo_cache.get_or_load(user.get("id"), f"search:{params.cache_key()}", loader)
+    if page["next_cursor"]:
+        response.headers[NEXT_CURSOR_HEADER] = page["next_cursor"]
+    return page["todos"]
+
+@router.get("/stats", status_code=status.HTTP_200_OK, response_model=TodoStatsResponse)
+async def read_todo_stats(user: user_dependency, db: AsyncSession = Depends(get_read_db)):
+    """Totais por prioridade/estado, lidos da todo_stats (não faz scan a todos)."""
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not logged in")
 
-    return todos_scalar
+    await write_behind.flush_pending(user.get("id"))
+    return summarize(await read_groups(db, user.get("id")))
 
-@router.get("/get-todo-id/{todo_id}", status_code=status.HTTP_200_OK)
-async def get_todo_by_todoid(user: user_dependency,db: AsyncSession = Depends(get_db), todo_id: int = Path(gt=0)):
+@router.get("/export", status_code=status.HTTP_200_OK)
+async def export_todos_from_user_id(user: user_dependency, format: ExportFormat = ExportFormat.ndjson):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not logged in")
+
+    await write_behind.flush_pending(user.get("id"))
+    stmt = select(*EXPORT_COLUMNS).where(md.Todos.owner_id == user.get("id")).order_by(md.Todos.id)
+    return stream_todos(stmt, format, f"todos-{user.get('id')}")
+
+@router.get("/get-todo-id/{todo_id}", status_code=status.HTTP_200_OK, response_model=Optional[TodoResponse])
+async def get_todo_by_todoid(user: user_dependency, request: Request, response: Response, db: AsyncSession = Depends(get_read_db), todo_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not logged in")
     
-    result = await db.execute(select(md.Todos).where(md.Todos.id == todo_id))
-    result_scalar = result.scalar_one_or_none()
-    
-    return result_scalar
+    generation, mtime = await todo_cache.version(user.get("id"))
+    etag = make_etag(user.get("id"), generation, f"todo:{todo_id}") if generation is not None else None
+    if etag and not_modified(request, etag):
+        return not_modified_response(etag, mtime)
+
+    async def loader():
+        result = await db.execute(select(*TODO_COLUMNS).where(md.Todos.id == todo_id))
+        row = result.one_or_none()
+        return todo_to_dict(row) if row is not None else None
+
+    # só fica em cache (e leva ETag) se for do próprio user: é esse que invalida nas escritas
+    def is_own(todo):
+        return todo is not None and todo["owner_id"] == user.get("id")
+
+    todo = await todo_cache.get_or_load(user.get("id"), f"todo:{todo_id}", loader, cacheable=is_own)
+    todo = write_behind.overlay(todo)
+    if etag and is_own(todo):
+        set_validators(response, etag, mtime)
+    return todo
     
 
-@router.get("/get-id/{todo_id}", status_code=status.HTTP_200_OK)
-async def read_id(todo_id: int = Path(gt=0), db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(md.Todos).where(md.Todos.id == todo_id))
-    todo = result.scalar_one_or_none()
+@router.get("/get-id/{todo_id}", status_code=status.HTTP_200_OK, response_model=TodoResponse)
+async def read_id(todo_id: int = Path(gt=0), db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(select(*TODO_COLUMNS).where(md.Todos.id == todo_id))
+    todo = result.one_or_none()
     if not todo:
         raise HTTPException(status_code=404, detail="TODO NOT FOUND")
-    return todo
+    return write_behind.overlay(todo_to_dict(todo))
 
-@router.post("/create-todo", name="todo_create", status_code=status.HTTP_201_CREATED)
+@router.post("/create-todo", name="todo_create", status_code=status.HTTP_201_CREATED, response_model=TodoResponse)
 async def create_todo(user: user_dependency, todo_request: TodoRequest, db: AsyncSession = Depends(get_db)):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
     
     # 1) todo_request.model_dump() -> devolve um dict com os campos válidos (ex.: {"title":..., "description":..., "priority":..., "complete":...})
-    # 2) ** (desempacotamento) -> envia cada par chave/valor como argumento nomeado do construtor md.Todos(...)
+    # 2) ** (desempacotamento) -> envia cada par chave/valor como argumento nomeado do .values(...)
     #3) owner_id=user["id"] -> força/define o dono da tarefa com o id do utilizador autenticado;
     #se viesse um 'owner_id' no body, seria ignorado porque este argumento vem por último (sobrepõe).
     
-    todo = md.Todos(**todo_request.model_dump(), owner_id=user["id"])
+    # INSERT ... RETURNING: devolve a linha criada sem o refresh (SELECT) a seguir
+    todos_table = md.Todos.__table__
     try:
-        db.add(todo)
+        result = await db.execute(
+            insert(todos_table).values(**todo_request.model_dump(), owner_id=user["id"]).returning(*todos_table.c)
+        )
+        todo = dict(result.one()._mapping)
         await db.commit()
-        await db.refresh(todo)
+        await todo_cache.invalidate(user["id"])
+        await event_bus.publish(user["id"], "todo.created", todo)
         return todo
     except Exception as e:
         await db.rollback()
@@ -110,41 +237,128 @@ async def delete_todo(user: user_dependency,todo_id: int, db: AsyncSession = Dep
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
     
-    result = await db.execute(select(md.Todos).where(md.Todos.id == todo_id, md.Todos.owner_id == user.get('id')))
-    todo_model = result.scalar_one_or_none()
+    # DELETE ... WHERE id AND owner_id RETURNING id: 0 linhas -> não existe ou não é dele
+    result = await db.execute(
+        delete(md.Todos.__table__)
+        .where(md.Todos.id == todo_id, md.Todos.owner_id == user.get('id'))
+        .returning(md.Todos.id)
+    )
     
-    if todo_model is None:
+    if result.scalar_one_or_none() is None:
         raise HTTPException(status_code=404,detail="NOT FOUND")
         
-    await db.delete(todo_model)
     await db.commit()
+    write_behind.discard([todo_id])
+    await todo_cache.invalidate(user.get('id'))
+    await event_bus.publish(user.get('id'), "todo.deleted", {"id": todo_id})
         
     return None
 
-@router.put("/update-todos/{todo_id}")
+@router.put("/update-todos/{todo_id}", response_model=TodoResponse)
 async def update_todo(user: user_dependency,
                         todo_id: int, 
                         todo_request: TodoRequest, 
                         db: AsyncSession = Depends(get_db)):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not logged in")
+
+    # write-behind (TODO_WRITE_BEHIND): responde já; o UPDATE vai no próximo lote com os
+    # outros updates, e o todo.updated sai depois do commit (ver write_behind.py)
+    if write_behind.accepts(todo_id):
+        todo = await write_behind.submit(db, user["id"], todo_id, todo_request.model_dump())
+        if todo is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo Not found")
+        await todo_cache.invalidate(user["id"])
+        return todo
     
-    todo: md.Todos = md.Todos(**todo_request.model_dump())
-    result = await db.execute(select(md.Todos).where(md.Todos.id == todo_id, md.Todos.owner_id == user["id"]))
-    todo_model = result.scalar_one_or_none()
+    # UPDATE ... WHERE id AND owner_id RETURNING *: uma ida à BD em vez de SELECT + UPDATE + refresh
+    todos_table = md.Todos.__table__
+    result = await db.execute(
+        update(todos_table)
+        .where(todos_table.c.id == todo_id, todos_table.c.owner_id == user["id"])
+        .values(**todo_request.model_dump())
+        .returning(*todos_table.c)
+    )
+    todo_model = result.one_or_none()
     
     if todo_model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo Not found")
+
+    await db.commit()
+    await todo_cache.invalidate(user["id"])
+    todo = dict(todo_model._mapping)
+    await event_bus.publish(user["id"], "todo.updated", todo)
         
-    if result is not None:
-        todo_model.title = todo_request.title
-        todo_model.description = todo.description
-        todo_model.priority = todo.priority
-        todo_model.complete = todo.complete
+    return todo
+
+@router.post("/batch", status_code=status.HTTP_200_OK)
+async def batch_todos(user: user_dependency, batch: TodoBatchRequest, db: AsyncSession = Depends(get_db)):
+    """Create/update/delete em lote numa só transação, com estado por item."""
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
+
+    owner_id = user["id"]
+    todos_table = md.Todos.__table__
+    # os updates pendentes deste user vão primeiro, senão o lote seguinte escrevia por cima
+    await write_behind.flush_pending(owner_id)
+    try:
+        # 1 SELECT para a ownership de todos os ids pedidos (update + delete)
+        owned = set()
+        requested_ids = {item.id for item in batch.update} | set(batch.delete)
+        if requested_ids:
+            result = await db.execute(
+                select(md.Todos.id).where(md.Todos.id.in_(requested_ids), md.Todos.owner_id == owner_id)
+            )
+            owned = set(result.scalars().all())
+
+        # INSERT ... VALUES (...), (...) RETURNING *, com as linhas pela ordem dos pedidos
+        # (o "index" do resultado aponta para created[i])
+        created = []
+        if batch.create:
+            result = await db.execute(
+                insert(todos_table).returning(*todos_table.c, sort_by_parameter_order=True),
+                [{**item.model_dump(), "owner_id": owner_id} for item in batch.create],
+            )
+            created = [dict(row._mapping) for row in result]
+
+        # UPDATE ... WHERE id = :id AND owner_id = :uid, em executemany
+        to_update = [item for item in batch.update if item.id in owned]
+        if to_update:
+            await db.execute(
+                update(todos_table)
+                .where(todos_table.c.id == bindparam("b_id"), todos_table.c.owner_id == owner_id)
+                .values(title=bindparam("title"), description=bindparam("description"),
+                        priority=bindparam("priority"), complete=bindparam("complete")),
+                [{**item.model_dump(exclude={"id"}), "b_id": item.id} for item in to_update],
+            )
+
+        deleted = set()
+        to_delete = [todo_id for todo_id in set(batch.delete) if todo_id in owned]
+        if to_delete:
+            result = await db.execute(
+                delete(todos_table)
+                .where(todos_table.c.id.in_(to_delete), todos_table.c.owner_id == owner_id)
+                .returning(todos_table.c.id)
+            )
+            deleted = set(result.scalars().all())
 
         await db.commit()
-        await db.refresh(todo_model)
-        
-        return todo_model
-    else:
-        raise HTTPException(status_code=404, detail="NOT FOUND TO UPDATE")
\ No newline at end of file
+        write_behind.discard(deleted)
+        await todo_cache.invalidate(owner_id)
+        await event_bus.publish(owner_id, "todo.batch", {
+            "created": [todo["id"] for todo in created],
+            "updated": [item.id for item in to_update],
+            "deleted": sorted(deleted),
+        })
+    except Exception as e:
+        await db.rollback()
+        print("BATCH_TODOS ERROR:", type(e).__name__, str(e))
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="ERROR 500")
+
+    return {
+        "create": [{"index": i, "status": status.HTTP_201_CREATED, "todo": todo} for i, todo in enumerate(created)],
+        "update": [{"id": item.id, "status": status.HTTP_200_OK if item.id in owned else status.HTTP_404_NOT_FOUND}
+                   for item in batch.update],
+        "delete": [{"id": todo_id, "status": status.HTTP_204_NO_CONTENT if todo_id in deleted else status.HTTP_404_NOT_FOUND}
+                   for todo_id in batch.delete],
+    }
@@ -4,12 +4,11 @@ from fastapi import Depends, HTTPException, Path, status
 from pydantic import Field, BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from database import AsyncSessionLocal
 import models as md
-from schema import TodoRequest
+from schema import TodoRequest, UserInfoResponse
 from .auth import get_current_user
 from database import get_db   
-from passlib.context import CryptContext
+from security import hash_password, verify_password
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -21,10 +20,7 @@ class UserVerification(BaseModel):
     new_password: str = Field(min_length=5)
     
 
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
-
-
-@router.get("/get_user",status_code=status.HTTP_200_OK)
+@router.get("/get_user",status_code=status.HTTP_200_OK, response_model=UserInfoResponse)
 async def get_logged_user(user: user_dependency, db: db_dependency):
     
     if user is None:
@@ -41,10 +37,10 @@ async def change_user_password(user: user_dependency, db: db_dependency, user_ve
     result = await db.execute(select(md.Users).where(md.Users.id == user.get('id')))
     user_logged_in: md.Users = result.scalar_one_or_none()
     
-    if not bcrypt_context.verify(user_verify.password, user_logged_in.hashed_password):
+    if not await verify_password(user_verify.password, user_logged_in.hashed_password):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="PASSWORD VERIFICATION FAILED")
     
-    user_logged_in.hashed_password = bcrypt_context.hash(user_verify.new_password)
+    user_logged_in.hashed_password = await hash_password(user_verify.new_password)
     
     await db.commit()
     await db.refresh(user_logged_in)
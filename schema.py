@@ -1,8 +1,72 @@
-from pydantic import BaseModel, Field
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class TodoRequest(BaseModel):
     title: str = Field(min_length=3)
     description: str = Field(min_length=3, max_length=300)
     priority: int = Field(gt=0, lt=10)
-    complete: bool 
\ No newline at end of file
+    complete: bool 
+
+
+# respostas: validadas/serializadas pelo pydantic-core em vez do jsonable_encoder (reflexão)
+class TodoResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: Optional[str] = None
+    description: Optional[str] = None
+    priority: Optional[int] = None
+    complete: Optional[bool] = None
+    owner_id: Optional[int] = None
+
+
+class TodoSearchResult(TodoResponse):
+    rank: float
+
+
+class TodoStatsBucket(BaseModel):
+    total: int
+    complete: int
+    pending: int
+
+
+class TodoStatsResponse(TodoStatsBucket):
+    by_priority: dict[int, TodoStatsBucket]
+
+
+class UserResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    username: str
+    email: str
+    role: Optional[str] = None
+    is_active: Optional[bool] = None
+
+
+class CurrentUserResponse(BaseModel):
+    id: int
+    username: str
+    role: Optional[str] = None
+
+
+class UserInfoResponse(BaseModel):
+    user_id: int
+    username: str
+    user_role: Optional[str] = None
+
+
+BATCH_MAX_ITEMS = 500
+
+
+class TodoBatchUpdate(TodoRequest):
+    id: int = Field(gt=0)
+
+
+class TodoBatchRequest(BaseModel):
+    create: list[TodoRequest] = Field(default_factory=list, max_length=BATCH_MAX_ITEMS)
+    update: list[TodoBatchUpdate] = Field(default_factory=list, max_length=BATCH_MAX_ITEMS)
+    delete: list[int] = Field(default_factory=list, max_length=BATCH_MAX_ITEMS)
+
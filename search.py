@@ -0,0 +1,97 @@
+import re
+from typing import Optional
+
+import sqlalchemy as sa
+from fastapi import Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models as md
+from pagination import DEFAULT_LIMIT, MAX_LIMIT, decode_cursor, encode_cursor
+from todo_cache import TODO_COLUMNS, todo_to_dict
+
+SEARCH_MAX_TERMS = 8
+# word_similarity mínima para um termo com erro ("projetco") ainda contar
+TRIGRAM_THRESHOLD = 0.4
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+class TodoSearchParams:
+    """q + paginação. O cursor é a posição no ranking (o rank não é uma chave estável)."""
+
+    def __init__(
+        self,
+        q: str = Query(min_length=1, max_length=200),
+        limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+        cursor: Optional[str] = Query(None),
+    ):
+        self.q = q
+        self.limit = limit
+        self.cursor = cursor
+        self.terms = _TERM.findall(q.lower())[:SEARCH_MAX_TERMS]
+        self.offset = decode_cursor(cursor, 1)[0] if cursor else 0
+
+    def cache_key(self) -> str:
+        return f"{' '.join(self.terms)}:{self.limit}:{self.offset}"
+
+
+def _postgres_query(owner_id: int, params: TodoSearchParams):
+    # "proj rev" -> proj:* & rev:*  (prefixo; os termos só têm \w, seguros dentro do tsquery)
+    tsquery = sa.func.to_tsquery(md.TS_CONFIG, " & ".join(f"{term}:*" for term in params.terms))
+    text = " ".join(params.terms)
+    matches_fts = md.TODO_SEARCH_VECTOR.op("@@")(tsquery)
+    # <% usa o índice trigram (word_similarity >= pg_trgm.word_similarity_threshold)
+    matches_fuzzy = sa.literal(text).op("<%")(md.TODO_SEARCH_LOWER)
+    rank = (
+        sa.func.ts_rank_cd(md.TODO_SEARCH_VECTOR, tsquery)
+        + sa.func.word_similarity(sa.literal(text), md.TODO_SEARCH_LOWER)
+    )
+    return (
+        sa.select(*TODO_COLUMNS, rank.label("rank"))
+        .where(md.Todos.owner_id == owner_id, sa.or_(matches_fts, matches_fuzzy))
+        .order_by(sa.desc("rank"), md.Todos.id.desc())
+    )
+
+
+def _sqlite_query(owner_id: int, params: TodoSearchParams):
+    """Fallback para SQLite (testes/local): todos os termos como substring, título pesa 2x.
+
+    Sem índice de texto: faz scan só aos todos do user (ix_todos_owner_id_id) e não
+    apanha erros de escrita como o trigram do Postgres.
+    """
+    title = sa.func.lower(sa.func.coalesce(md.Todos.title, ""))
+    description = sa.func.lower(sa.func.coalesce(md.Todos.description, ""))
+    conditions, rank = [], sa.literal(0.0)
+    for term in params.terms:
+        in_title = sa.func.instr(title, term) > 0
+        in_description = sa.func.instr(description, term) > 0
+        conditions.append(sa.or_(in_title, in_description))
+        rank = rank + sa.case((in_title, 2.0), else_=0.0) + sa.case((in_description, 1.0), else_=0.0)
+    return (
+        sa.select(*TODO_COLUMNS, rank.label("rank"))
+        .where(md.Todos.owner_id == owner_id, *conditions)
+        .order_by(sa.desc("rank"), md.Todos.id.desc())
+    )
+
+
+async def search_todos(db: AsyncSession, owner_id: int, params: TodoSearchParams) -> dict:
+    """Todos do user que casam com `q`, por relevância: {"todos": [...], "next_cursor": ...}."""
+    if not params.terms:
+        return {"todos": [], "next_cursor": None}
+
+    if db.bind.dialect.name == "postgresql":
+        await db.execute(sa.text(f"SET LOCAL pg_trgm.word_similarity_threshold = {TRIGRAM_THRESHOLD}"))
+        stmt = _postgres_query(owner_id, params)
+    else:
+        stmt = _sqlite_query(owner_id, params)
+
+    result = await db.execute(stmt.offset(params.offset).limit(params.limit + 1))
+    rows = result.all()
+    next_cursor = None
+    if len(rows) > params.limit:
+        rows = rows[:params.limit]
+        next_cursor = encode_cursor([params.offset + params.limit])
+    return {
+        "todos": [{**todo_to_dict(row), "rank": round(float(row.rank), 4)} for row in rows],
+        "next_cursor": next_cursor,
+    }
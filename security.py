@@ -0,0 +1,119 @@
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+# um só CryptContext para toda a app (auth + users)
+bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+
+PASSWORD_POOL = os.getenv("PASSWORD_POOL", "thread")          # thread | process
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", "64"))
+PASSWORD_RETRY_AFTER = os.getenv("PASSWORD_RETRY_AFTER", "1")
+
+
+def _hash(password: str) -> str:
+    return bcrypt_context.hash(password)
+
+
+def _verify(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt_context.verify(password, hashed or "")
+    except Exception:
+        return False
+
+
+def _load_backend() -> str:
+    # o passlib só escolhe/importa o backend do bcrypt no primeiro hash/verify
+    return bcrypt_context.handler("bcrypt").get_backend()
+
+
+class PasswordHasher:
+    """Corre o bcrypt num pool à parte, com limite de pedidos pendentes.
+
+    Acima de `max_pending` o pedido é recusado com 503 + Retry-After em vez de
+    ficar em fila atrás de um flood de logins.
+    """
+
+    def __init__(self, workers: int, max_pending: int, pool: str = "thread"):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pool = pool
+        self._executor: Optional[Executor] = None
+        self.pending = 0
+        self.rejected = 0
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.pool == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many login attempts, try again",
+                headers={"Retry-After": PASSWORD_RETRY_AFTER},
+            )
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            elapsed = time.perf_counter() - start
+            self.calls += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(_verify, password, hashed)
+
+    async def warm(self) -> None:
+        """Arranca os workers do pool e carrega o backend, sem pagar um bcrypt inteiro."""
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(executor, _load_backend) for _ in range(self.workers)))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "pool": self.pool,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "queued": max(0, self.pending - self.workers),
+            "rejected": self.rejected,
+            "calls": self.calls,
+            "avg_seconds": self.total_seconds / self.calls if self.calls else 0.0,
+            "max_seconds": self.max_seconds,
+        }
+
+
+password_hasher = PasswordHasher(PASSWORD_WORKERS, PASSWORD_MAX_PENDING, PASSWORD_POOL)
+
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await password_hasher.verify(password, hashed)
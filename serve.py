@@ -0,0 +1,286 @@
+"""Launcher de produção: um master leve que arranca e vigia N workers uvicorn.
+
+    python serve.py                          # WEB_WORKERS workers em 0.0.0.0:$PORT
+    python serve.py --workers 4 --port 8000
+    kill -HUP <pid do master>                # rolling restart (apanha código novo)
+    kill -TERM <pid do master>               # pára: cada worker acaba os pedidos em curso
+
+O master abre o socket uma vez e cria os workers antes de haver pedidos; todos fazem
+accept no mesmo socket. O master não importa a app: cada worker (spawn) importa o
+main, corre o lifespan (schema + warmup) e só então avisa que está pronto.
+O primeiro worker arranca sozinho, para as migrações correrem uma só vez.
+
+- uvloop + httptools quando instalados (uvicorn[standard]); WEB_LOOP / WEB_HTTP mudam isso
+- WEB_MAX_REQUESTS: o worker sai ao fim de N pedidos (+ jitter, para não saírem todos
+  juntos) e o master põe outro no lugar; os pedidos entretanto ficam no backlog do socket
+- SIGHUP: um worker novo de cada vez; o antigo só recebe SIGTERM quando o novo está pronto
+- TRUSTED_PROXY_HOPS passa a 1 (um proxy à frente); exposto diretamente, TRUSTED_PROXY_HOPS=0
+- no shutdown o worker fecha os streams SSE (o browser religa a outro) e espera até
+  WEB_GRACEFUL_TIMEOUT pelos pedidos em curso; o lifespan fecha os pools da BD
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import time
+from typing import Optional
+
+import uvicorn
+from uvicorn.importer import import_from_string
+
+APP = "main:app"
+# chamado quando o worker começa a sair, antes de esperar pelas ligações abertas
+DRAIN_HOOK = "main:begin_drain"
+
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "10000"))
+WEB_LOOP = os.getenv("WEB_LOOP", "auto")          # auto = uvloop, se instalado
+WEB_HTTP = os.getenv("WEB_HTTP", "auto")          # auto = httptools, se instalado
+WEB_MAX_REQUESTS = int(os.getenv("WEB_MAX_REQUESTS", "0"))   # 0 = não recicla
+WEB_MAX_REQUESTS_JITTER = int(os.getenv("WEB_MAX_REQUESTS_JITTER", str(WEB_MAX_REQUESTS // 10)))
+WEB_GRACEFUL_TIMEOUT = float(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+WEB_READY_TIMEOUT = float(os.getenv("WEB_READY_TIMEOUT", "60"))
+# ao sair, as ligações keep-alive ainda são servidas (com "Connection: close") durante isto
+WEB_DRAIN_SECONDS = float(os.getenv("WEB_DRAIN_SECONDS", "2"))
+
+
+class WorkerServer(uvicorn.Server):
+    """uvicorn.Server que avisa o master quando aceita pedidos e drena a app quando vai sair."""
+
+    def __init__(self, config: uvicorn.Config, ready):
+        super().__init__(config)
+        self.ready = ready
+        self.draining = False
+
+    def _close_when_draining(self, app):
+        async def wrapped(scope, receive, send):
+            if scope["type"] != "http":
+                return await app(scope, receive, send)
+
+            async def send_wrapper(message):
+                if self.draining and message["type"] == "http.response.start":
+                    message["headers"] = [*message.get("headers", ()), (b"connection", b"close")]
+                await send(message)
+
+            await app(scope, receive, send_wrapper)
+
+        return wrapped
+
+    async def startup(self, sockets=None) -> None:
+        # as ligações criadas a seguir usam esta app; o lifespan já tem a original
+        self.config.loaded_app = self._close_when_draining(self.config.loaded_app)
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            self.ready.set()
+
+    async def shutdown(self, sockets=None) -> None:
+        try:
+            import_from_string(DRAIN_HOOK)()
+        except Exception as e:
+            print("SERVE DRAIN ERROR:", type(e).__name__, str(e))
+        # pára o accept, mas deixa os clientes keep-alive acabar o pedido seguinte e fechar
+        # eles próprios (fechar uma ligação inativa perde o pedido que venha a caminho)
+        self.draining = True
+        for server in self.servers:
+            server.close()
+        deadline = time.monotonic() + WEB_DRAIN_SECONDS
+        while self.server_state.connections and time.monotonic() < deadline and not self.force_exit:
+            await asyncio.sleep(0.05)
+        await super().shutdown(sockets=sockets)
+
+
+def _run_worker(sock, ready, max_requests: int, options: dict) -> None:
+    config = uvicorn.Config(
+        APP,
+        loop=options["loop"],
+        http=options["http"],
+        lifespan="on",
+        limit_max_requests=max_requests or None,
+        timeout_graceful_shutdown=options["graceful_timeout"],
+        log_level=options["log_level"],
+        access_log=options["access_log"],
+    )
+    WorkerServer(config, ready).run(sockets=[sock])
+
+
+class Worker:
+    __slots__ = ("process", "ready", "started", "retiring")
+
+    def __init__(self, process, ready):
+        self.process = process
+        self.ready = ready
+        self.started = time.monotonic()
+        self.retiring = False
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid
+
+
+class Master:
+    def __init__(self, sock, size: int, options: dict):
+        self.sock = sock
+        self.size = size
+        self.options = options
+        # spawn: cada worker importa o código que estiver em disco (o rolling restart apanha-o)
+        self.ctx = multiprocessing.get_context("spawn")
+        self.workers: list = []
+        self.stopping = False
+        self.reload_requested = False
+        self.failures = 0
+
+    def spawn(self) -> Worker:
+        max_requests = 0
+        if WEB_MAX_REQUESTS > 0:
+            max_requests = WEB_MAX_REQUESTS + random.randint(0, WEB_MAX_REQUESTS_JITTER)
+        ready = self.ctx.Event()
+        process = self.ctx.Process(
+            target=_run_worker, args=(self.sock, ready, max_requests, self.options), name="todo-worker",
+        )
+        process.start()
+        worker = Worker(process, ready)
+        self.workers.append(worker)
+        return worker
+
+    def wait_ready(self, worker: Worker, timeout: float = WEB_READY_TIMEOUT) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not self.stopping:
+            if worker.ready.wait(0.1):
+                return True
+            if not worker.process.is_alive():
+                return False
+        return False
+
+    def active(self) -> list:
+        return [w for w in self.workers if not w.retiring]
+
+    def retire(self, worker: Worker) -> None:
+        worker.retiring = True
+        if worker.process.is_alive():
+            worker.process.terminate()
+
+    def reap(self) -> None:
+        for worker in list(self.workers):
+            if worker.process.is_alive():
+                continue
+            worker.process.join()
+            self.workers.remove(worker)
+            if worker.retiring or self.stopping:
+                continue
+            code = worker.process.exitcode
+            if code == 0:
+                print(f"SERVE: worker {worker.pid} recycled")
+            else:
+                print(f"SERVE ERROR: worker {worker.pid} exited with code {code}")
+                # morreu logo a arrancar: espera um pouco antes do próximo (BD em baixo, etc.)
+                if time.monotonic() - worker.started < 5:
+                    self.failures += 1
+                    time.sleep(min(2 ** self.failures, 30))
+        while not self.stopping and len(self.active()) < self.size:
+            worker = self.spawn()
+            if self.wait_ready(worker):
+                self.failures = 0
+
+    def rolling_restart(self) -> None:
+        print(f"SERVE: rolling restart of {len(self.active())} workers")
+        for old in self.active():
+            new = self.spawn()
+            if not self.wait_ready(new):
+                print(f"SERVE ERROR: new worker {new.pid} not ready, keeping the old ones")
+                self.retire(new)
+                return
+            self.retire(old)
+
+    def stop(self) -> None:
+        self.stopping = True
+        for worker in self.workers:
+            self.retire(worker)
+        deadline = time.monotonic() + WEB_GRACEFUL_TIMEOUT + 5
+        for worker in self.workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                print(f"SERVE ERROR: worker {worker.pid} did not stop, killing it")
+                worker.process.kill()
+                worker.process.join()
+
+    def _on_stop(self, sig, frame) -> None:
+        self.stopping = True
+
+    def _on_reload(self, sig, frame) -> None:
+        self.reload_requested = True
+
+    def run(self) -> int:
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._on_reload)
+
+        # o primeiro sozinho: migra o schema; os outros só confirmam a versão
+        first = self.spawn()
+        if not self.wait_ready(first):
+            print("SERVE ERROR: first worker failed to start")
+            self.stop()
+            return 1
+        for worker in [self.spawn() for _ in range(self.size - 1)]:
+            self.wait_ready(worker)
+        print(f"SERVE: {len(self.active())} workers ready on pid(s) {[w.pid for w in self.active()]}")
+
+        while not self.stopping:
+            time.sleep(0.2)
+            if self.reload_requested:
+                self.reload_requested = False
+                self.rolling_restart()
+            self.reap()
+        print("SERVE: stopping")
+        self.stop()
+        return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Arranca WEB_WORKERS workers uvicorn com main:app.")
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS)
+    parser.add_argument("--host", default=WEB_HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-access-log", action="store_true")
+    args = parser.parse_args()
+
+    # warmup em cada worker, antes de entrar no accept (o default de main é sem warmup)
+    os.environ.setdefault("STARTUP_WARMUP", "true")
+    # em produção há o proxy da plataforma à frente: sem isto todos os anónimos tinham o IP
+    # do proxy e os limites por IP (login, registo) eram um só limite para o site inteiro
+    os.environ.setdefault("TRUSTED_PROXY_HOPS", "1")
+    if args.workers > 1 and os.getenv("TODO_WRITE_BEHIND", "false").lower() in ("1", "true", "yes"):
+        # fila por worker: dois PUTs ao mesmo todo em workers diferentes podiam commitar trocados
+        print("SERVE ERROR: TODO_WRITE_BEHIND=true needs --workers 1 (the write-behind queue is per worker)")
+        sys.exit(2)
+    if args.workers > 1 and os.getenv("TODO_CACHE_BACKEND", "memory") != "redis":
+        # cache por worker: uma escrita só invalida a cache do worker que a fez, e os outros
+        # continuavam a servir listas velhas
+        print("SERVE ERROR: --workers > 1 needs TODO_CACHE_BACKEND=redis (the memory/fake todo cache is per worker)")
+        sys.exit(2)
+    if args.workers > 1 and os.getenv("EVENTS_BACKEND", "memory") == "memory":
+        print("SERVE WARNING: EVENTS_BACKEND=memory only reaches SSE clients on the same worker")
+
+    sock = uvicorn.Config(APP, host=args.host, port=args.port).bind_socket()
+    options = {
+        "loop": WEB_LOOP,
+        "http": WEB_HTTP,
+        "graceful_timeout": WEB_GRACEFUL_TIMEOUT,
+        "log_level": args.log_level,
+        "access_log": not args.no_access_log,
+    }
+    master = Master(sock, max(1, args.workers), options)
+    try:
+        code = master.run()
+    finally:
+        sock.close()
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
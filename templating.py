@@ -0,0 +1,39 @@
+import os
+from pathlib import Path
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, TemplateSyntaxError
+
+from assets import asset_url
+
+BASE_DIR = Path(__file__).resolve().parent
+TEMPLATES_DIR = BASE_DIR / "templates"
+TEMPLATE_CACHE_DIR = Path(os.getenv("TEMPLATE_CACHE_DIR", str(BASE_DIR / ".jinja_cache")))
+# em produção: false -> não faz stat() aos ficheiros em cada render
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "true").lower() in ("1", "true", "yes")
+
+TEMPLATE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+# um só Environment para a app toda (main + routers), com bytecode em disco entre arranques
+env = Environment(
+    loader=FileSystemLoader(str(TEMPLATES_DIR)),
+    autoescape=True,
+    auto_reload=TEMPLATE_AUTO_RELOAD,
+    bytecode_cache=FileSystemBytecodeCache(str(TEMPLATE_CACHE_DIR)),
+    cache_size=-1,
+)
+env.globals["asset_url"] = asset_url
+
+templates = Jinja2Templates(env=env)
+
+
+def precompile_templates() -> list[str]:
+    """Compila todos os templates para a cache do Environment (chamado no arranque)."""
+    compiled = []
+    for name in env.list_templates():
+        try:
+            env.get_template(name)
+            compiled.append(name)
+        except TemplateSyntaxError as e:
+            print("TEMPLATE ERROR:", name, str(e))
+    return compiled
@@ -0,0 +1,166 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+import models as md
+from database import note_write
+
+MTIME_TTL = 7 * 24 * 3600
+TODO_FIELDS = tuple(c.key for c in md.Todos.__table__.columns)
+# select(*TODO_COLUMNS) devolve Rows (tuplos) em vez de entidades ORM
+TODO_COLUMNS = tuple(getattr(md.Todos, field) for field in TODO_FIELDS)
+
+
+def todo_to_dict(todo) -> dict:
+    """ORM Todos (ou Row) -> dict simples, que se pode guardar em qualquer backend."""
+    return {field: getattr(todo, field) for field in TODO_FIELDS}
+
+
+class MemoryCacheBackend:
+    """LRU em processo com TTL por entrada (default)."""
+
+    # gerações só deste processo: recomeçam a cada arranque e cada worker tem as suas
+    shared = False
+
+    def __init__(self, maxsize: int = 5000):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        # contadores ficam fora da LRU: perder uma geração voltaria a expor entradas velhas
+        self._counters: dict[str, int] = {}
+
+    async def get(self, key: str):
+        if key in self._counters:
+            return self._counters[key]
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+
+class FakeSharedBackend(MemoryCacheBackend):
+    """Fake local do backend partilhado: passa os valores por JSON como o Redis faria."""
+
+    # faz de Redis (ETag/304 incluídos), mas só serve com um processo: é para testes
+    shared = True
+
+    async def get(self, key: str):
+        value = await super().get(key)
+        return value if value is None or isinstance(value, int) else json.loads(value)
+
+    async def set(self, key: str, value, ttl: float) -> None:
+        await super().set(key, json.dumps(value), ttl)
+
+
+class RedisCacheBackend:
+    """Backend partilhado entre workers (precisa do pacote `redis`)."""
+
+    # gerações partilhadas por todos os workers e persistentes (INCR no Redis)
+    shared = True
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("TODO_CACHE_BACKEND=redis needs the 'redis' package") from e
+        self._redis = aioredis.from_url(url)
+
+    async def get(self, key: str):
+        raw = await self._redis.get(key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: str, value, ttl: float) -> None:
+        await self._redis.set(key, json.dumps(value), ex=max(1, int(ttl)))
+
+    async def incr(self, key: str) -> int:
+        return await self._redis.incr(key)
+
+
+class TodoCache:
+    """Cache de leituras de todos por utilizador.
+
+    As chaves levam a geração do utilizador (todos:<uid>:<gen>:...). Qualquer
+    escrita faz `invalidate(uid)`, que só incrementa a geração: as entradas
+    antigas deixam de ser lidas e acabam por sair por LRU/TTL.
+    """
+
+    def __init__(self, backend, ttl: float = 60.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def generation(self, user_id) -> int:
+        return await self.backend.get(f"todos:{user_id}:gen") or 0
+
+    async def version(self, user_id) -> tuple[Optional[int], Optional[float]]:
+        """(geração, timestamp da última escrita ou None) — usado para ETag/Last-Modified.
+
+        (None, None) num backend por processo: a escrita feita noutro worker (ou antes
+        de um restart) não mexe nesta geração e o 304 ficava velho para sempre.
+        """
+        if not self.backend.shared:
+            return None, None
+        return await self.generation(user_id), await self.backend.get(f"todos:{user_id}:mtime")
+
+    async def get_or_load(self, user_id, key: str, loader: Callable[[], Awaitable[Any]],
+                          cacheable: Callable[[Any], bool] = lambda value: value is not None):
+        full_key = f"todos:{user_id}:{await self.generation(user_id)}:{key}"
+        value = await self.backend.get(full_key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = await loader()
+        if cacheable(value):
+            await self.backend.set(full_key, value, self.ttl)
+        return value
+
+    async def invalidate(self, user_id: Optional[int]) -> None:
+        if user_id is None:
+            return
+        note_write(user_id)
+        await self.backend.incr(f"todos:{user_id}:gen")
+        await self.backend.set(f"todos:{user_id}:mtime", time.time(), MTIME_TTL)
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "db_queries_saved": self.hits,
+            "invalidations": self.invalidations,
+        }
+
+
+def _make_backend():
+    kind = os.getenv("TODO_CACHE_BACKEND", "memory")
+    if kind == "redis":
+        return RedisCacheBackend(os.getenv("TODO_CACHE_URL", "redis://localhost:6379/0"))
+    if kind == "fake":
+        return FakeSharedBackend(int(os.getenv("TODO_CACHE_SIZE", "5000")))
+    return MemoryCacheBackend(int(os.getenv("TODO_CACHE_SIZE", "5000")))
+
+
+todo_cache = TodoCache(_make_backend(), ttl=float(os.getenv("TODO_CACHE_TTL", "60")))
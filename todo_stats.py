@@ -0,0 +1,156 @@
+import argparse
+import asyncio
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models as md
+
+STATS_TABLE = md.TodoStats.__table__
+TODOS_TABLE = md.Todos.__table__
+
+# Cada INSERT/DELETE em todos, e cada UPDATE que mude dono/prioridade/estado, soma ou
+# tira 1 ao grupo certo na mesma transação. Editar só o título não toca em todo_stats.
+_PG_TRIGGERS = [
+    """
+    CREATE OR REPLACE FUNCTION todo_stats_apply() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE todo_stats SET count = count - 1
+            WHERE owner_id = COALESCE(OLD.owner_id, 0)
+              AND priority = COALESCE(OLD.priority, 0)
+              AND complete = COALESCE(OLD.complete, false);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO todo_stats (owner_id, priority, complete, count)
+            VALUES (COALESCE(NEW.owner_id, 0), COALESCE(NEW.priority, 0), COALESCE(NEW.complete, false), 1)
+            ON CONFLICT (owner_id, priority, complete) DO UPDATE SET count = todo_stats.count + 1;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS todos_stats_insert_delete ON todos",
+    """
+    CREATE TRIGGER todos_stats_insert_delete AFTER INSERT OR DELETE ON todos
+    FOR EACH ROW EXECUTE FUNCTION todo_stats_apply()
+    """,
+    "DROP TRIGGER IF EXISTS todos_stats_update ON todos",
+    """
+    CREATE TRIGGER todos_stats_update AFTER UPDATE ON todos
+    FOR EACH ROW WHEN (OLD.owner_id IS DISTINCT FROM NEW.owner_id
+                       OR OLD.priority IS DISTINCT FROM NEW.priority
+                       OR OLD.complete IS DISTINCT FROM NEW.complete)
+    EXECUTE FUNCTION todo_stats_apply()
+    """,
+]
+
+_SQLITE_ADD = """
+    INSERT INTO todo_stats (owner_id, priority, complete, count)
+    VALUES (COALESCE(NEW.owner_id, 0), COALESCE(NEW.priority, 0), COALESCE(NEW.complete, 0), 1)
+    ON CONFLICT (owner_id, priority, complete) DO UPDATE SET count = count + 1;
+"""
+_SQLITE_REMOVE = """
+    UPDATE todo_stats SET count = count - 1
+    WHERE owner_id = COALESCE(OLD.owner_id, 0) AND priority = COALESCE(OLD.priority, 0)
+      AND complete = COALESCE(OLD.complete, 0);
+"""
+_SQLITE_TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS todos_stats_insert AFTER INSERT ON todos BEGIN {_SQLITE_ADD} END",
+    f"CREATE TRIGGER IF NOT EXISTS todos_stats_delete AFTER DELETE ON todos BEGIN {_SQLITE_REMOVE} END",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS todos_stats_update AFTER UPDATE OF owner_id, priority, complete ON todos
+    WHEN OLD.owner_id IS NOT NEW.owner_id OR OLD.priority IS NOT NEW.priority OR OLD.complete IS NOT NEW.complete
+    BEGIN {_SQLITE_REMOVE} {_SQLITE_ADD} END
+    """,
+]
+
+TRIGGERS = {"postgresql": _PG_TRIGGERS, "sqlite": _SQLITE_TRIGGERS}
+
+
+def _rebuild_statements(owner_id: Optional[int]):
+    grouped = (
+        sa.select(
+            sa.func.coalesce(TODOS_TABLE.c.owner_id, 0),
+            sa.func.coalesce(TODOS_TABLE.c.priority, 0),
+            sa.func.coalesce(TODOS_TABLE.c.complete, sa.false()),
+            sa.func.count(),
+        )
+        .group_by(sa.literal_column("1"), sa.literal_column("2"), sa.literal_column("3"))
+    )
+    clear = sa.delete(STATS_TABLE)
+    if owner_id is not None:
+        grouped = grouped.where(TODOS_TABLE.c.owner_id == owner_id)
+        clear = clear.where(STATS_TABLE.c.owner_id == owner_id)
+    fill = sa.insert(STATS_TABLE).from_select(["owner_id", "priority", "complete", "count"], grouped)
+    return clear, fill
+
+
+def install_triggers(connection) -> None:
+    """(Re)cria os triggers e, se todo_stats está vazia, preenche-a. Chamado pela migração 3."""
+    statements = TRIGGERS.get(connection.dialect.name)
+    if statements is None:
+        return
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+    # BD que já tinha todos antes desta tabela existir
+    if connection.scalar(sa.select(sa.func.count()).select_from(STATS_TABLE)) == 0:
+        for statement in _rebuild_statements(None):
+            connection.execute(statement)
+
+
+async def rebuild_stats(db: AsyncSession, owner_id: Optional[int] = None) -> dict:
+    """Recalcula todo_stats a partir de todos (tudo ou um só dono) e diz quantos grupos mudaram."""
+    if db.bind.dialect.name == "postgresql":
+        # bloqueia escritas em todos (não as leituras) enquanto recalcula
+        await db.execute(sa.text("LOCK TABLE todos IN SHARE MODE"))
+    before = await read_groups(db, owner_id)
+    clear, fill = _rebuild_statements(owner_id)
+    await db.execute(clear)
+    await db.execute(fill)
+    after = await read_groups(db, owner_id)
+    await db.commit()
+    drifted = sum(1 for key in before.keys() | after.keys() if before.get(key, 0) != after.get(key, 0))
+    return {"owner_id": owner_id, "groups": len(after), "drifted_groups": drifted}
+
+
+async def read_groups(db: AsyncSession, owner_id: Optional[int] = None) -> dict:
+    """{(priority, complete): count} somado por todos os donos (ou só um). Só lê todo_stats."""
+    stmt = (
+        sa.select(STATS_TABLE.c.priority, STATS_TABLE.c.complete, sa.func.sum(STATS_TABLE.c.count))
+        .where(STATS_TABLE.c.count != 0)
+        .group_by(STATS_TABLE.c.priority, STATS_TABLE.c.complete)
+    )
+    if owner_id is not None:
+        stmt = stmt.where(STATS_TABLE.c.owner_id == owner_id)
+    result = await db.execute(stmt)
+    return {(priority, bool(complete)): int(count) for priority, complete, count in result.all()}
+
+
+def summarize(groups: dict) -> dict:
+    """Formato da resposta: totais + por prioridade (para os gráficos)."""
+    by_priority: dict = {}
+    for (priority, complete), count in sorted(groups.items()):
+        entry = by_priority.setdefault(priority, {"total": 0, "complete": 0, "pending": 0})
+        entry["total"] += count
+        entry["complete" if complete else "pending"] += count
+    complete_count = sum(count for (_, complete), count in groups.items() if complete)
+    total = sum(groups.values())
+    return {"total": total, "complete": complete_count, "pending": total - complete_count, "by_priority": by_priority}
+
+
+async def _main():
+    from database import AsyncSessionLocal, dispose_engines
+
+    parser = argparse.ArgumentParser(description="Recalcula todo_stats a partir da tabela todos.")
+    parser.add_argument("--owner-id", type=int, default=None, help="só este utilizador")
+    args = parser.parse_args()
+    async with AsyncSessionLocal() as db:
+        print(await rebuild_stats(db, args.owner_id))
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    # python todo_stats.py [--owner-id N]
+    asyncio.run(_main())
@@ -0,0 +1,52 @@
+import asyncio
+import os
+import time
+
+import sqlalchemy as sa
+
+from database import DB_POOL_SIZE, get_engine, get_replica_engine
+from security import password_hasher
+from templating import precompile_templates
+
+# desligado: arranca logo e paga o custo no primeiro pedido (ligações, templates, bcrypt)
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "false").lower() in ("1", "true", "yes")
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", str(DB_POOL_SIZE)))
+
+# o que o /ready devolve; preenchido pelo lifespan do main
+startup_state = {
+    "ready": False,
+    "pid": None,
+    "schema_version": None,
+    "warmed": False,
+    "import_seconds": None,
+    "startup_seconds": None,
+}
+
+
+async def warm_pool(engine, connections: int) -> int:
+    """Abre `connections` ligações ao mesmo tempo (SELECT 1) e devolve-as ao pool já abertas."""
+    if engine.dialect.name == "sqlite":
+        # pools do SQLite: um ficheiro local, não há handshake para poupar
+        connections = 1
+    conns = await asyncio.gather(*(engine.connect().start() for _ in range(connections)))
+    try:
+        await asyncio.gather(*(conn.execute(sa.text("SELECT 1")) for conn in conns))
+    finally:
+        for conn in conns:
+            await conn.close()
+    return len(conns)
+
+
+async def warmup() -> dict:
+    """Paga antes do /ready o que o primeiro pedido pagaria: pool, templates e pool do bcrypt."""
+    start = time.perf_counter()
+    opened = 0
+    for engine in {get_engine(), get_replica_engine()}:
+        opened += await warm_pool(engine, WARMUP_CONNECTIONS)
+    templates = precompile_templates()
+    await password_hasher.warm()
+    return {
+        "connections": opened,
+        "templates": len(templates),
+        "seconds": round(time.perf_counter() - start, 4),
+    }
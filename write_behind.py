@@ -0,0 +1,259 @@
+import asyncio
+import os
+import time
+from typing import Iterable, Optional
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models as md
+from database import AsyncSessionLocal
+from events import event_bus
+from metrics import COUNT_BUCKETS, LATENCY_BUCKETS, Histogram, registry
+from todo_cache import todo_cache
+
+TODO_WRITE_BEHIND = os.getenv("TODO_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+TODO_WRITE_BEHIND_WINDOW = float(os.getenv("TODO_WRITE_BEHIND_WINDOW", "0.25"))
+TODO_WRITE_BEHIND_MAX_PENDING = int(os.getenv("TODO_WRITE_BEHIND_MAX_PENDING", "5000"))
+TODO_WRITE_BEHIND_MAX_BATCH = int(os.getenv("TODO_WRITE_BEHIND_MAX_BATCH", "500"))
+# flushes falhados por todo antes de desistir dele (BD em baixo ~ MAX_RETRIES janelas)
+TODO_WRITE_BEHIND_MAX_RETRIES = int(os.getenv("TODO_WRITE_BEHIND_MAX_RETRIES", "20"))
+# no shutdown: tentativas de escrever o que ficou na fila antes de desistir (e dizer o quê)
+SHUTDOWN_FLUSH_ATTEMPTS = 3
+
+flush_duration = registry.register(Histogram(
+    "write_behind_flush_duration_seconds", "Time to write one batch of coalesced todo updates.", LATENCY_BUCKETS))
+flush_delay = registry.register(Histogram(
+    "write_behind_flush_delay_seconds", "Time from a todo's first accepted update to its commit.", LATENCY_BUCKETS))
+flush_rows = registry.register(Histogram(
+    "write_behind_flush_rows", "Todos written per batch.", COUNT_BUCKETS))
+
+_todos = md.Todos.__table__
+_UPDATE = (
+    update(_todos)
+    .where(_todos.c.id == bindparam("b_id"), _todos.c.owner_id == bindparam("b_owner_id"))
+    .values(title=bindparam("title"), description=bindparam("description"),
+            priority=bindparam("priority"), complete=bindparam("complete"))
+)
+
+
+class PendingUpdate:
+    __slots__ = ("owner_id", "values", "first_at", "failures")
+
+    def __init__(self, owner_id, values: dict):
+        self.owner_id = owner_id
+        self.values = values
+        self.first_at = time.monotonic()
+        self.failures = 0
+
+
+class WriteBehindQueue:
+    """PUTs de todos aceites em memória e escritos em lote, um por todo, a cada `window` s.
+
+    Cada PUT substitui o todo inteiro (TodoRequest), por isso juntar N updates do
+    mesmo todo é ficar com o último. Leituras:
+    - de um todo (row, get-todo-id, get-id): `overlay` põe por cima o valor pendente;
+    - que filtram, ordenam ou agregam (listas, pesquisa, stats, export): chamam
+      `flush_pending` antes, que só escreve se houver algo pendente desse user.
+    Os eventos todo.updated saem depois do commit, para outros workers lerem da BD.
+    A fila é por worker: um kill -9 perde no máximo uma janela de updates, e com
+    vários workers dois PUTs ao mesmo todo podiam ser escritos pela ordem errada
+    (o serve.py recusa TODO_WRITE_BEHIND com WEB_WORKERS > 1).
+    """
+
+    def __init__(self, enabled: bool, window: float, max_pending: int, max_batch: int, max_retries: int):
+        self.enabled = enabled
+        self.window = window
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self._pending: dict = {}
+        self._by_owner: dict = {}
+        # a ser escritos agora: continuam visíveis para o overlay até ao commit
+        self._inflight: dict = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.accepted = 0
+        self.coalesced = 0
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def accepts(self, todo_id: int) -> bool:
+        # cheio: só junta a todos já pendentes, os outros vão pelo UPDATE normal
+        return self.enabled and (todo_id in self._pending or len(self._pending) < self.max_pending)
+
+    async def submit(self, db: AsyncSession, owner_id: int, todo_id: int, values: dict) -> Optional[dict]:
+        """Aceita o update e devolve o todo como vai ficar; None se não existe ou não é do user."""
+        entry = self._pending.get(todo_id)
+        if entry is None or entry.owner_id != owner_id:
+            inflight = self._inflight.get(todo_id)
+            if inflight is None or inflight.owner_id != owner_id:
+                # só o primeiro update de cada todo vai à BD (e é um SELECT, não uma escrita)
+                result = await db.execute(
+                    select(md.Todos.id).where(md.Todos.id == todo_id, md.Todos.owner_id == owner_id)
+                )
+                if result.scalar_one_or_none() is None:
+                    return None
+            entry = self._pending.get(todo_id)
+        if entry is not None and entry.owner_id == owner_id:
+            entry.values = values
+            self.coalesced += 1
+        else:
+            self._pending[todo_id] = PendingUpdate(owner_id, values)
+            self._by_owner.setdefault(owner_id, set()).add(todo_id)
+        self.accepted += 1
+        return {"id": todo_id, **values, "owner_id": owner_id}
+
+    def overlay(self, todo: Optional[dict]) -> Optional[dict]:
+        """Todo lido da BD/cache -> com o valor pendente por cima (cópia; o da cache não muda)."""
+        if todo is None or not (self._pending or self._inflight):
+            return todo
+        entry = self._pending.get(todo["id"]) or self._inflight.get(todo["id"])
+        if entry is None or entry.owner_id != todo["owner_id"]:
+            return todo
+        return {**todo, **entry.values}
+
+    def discard(self, todo_ids: Iterable[int]) -> None:
+        """Todos apagados: o update pendente já não tem onde cair."""
+        for todo_id in todo_ids:
+            self._take(todo_id)
+
+    async def flush_pending(self, owner_id: Optional[int] = None) -> None:
+        """Barreira antes de uma leitura/escrita direta: escreve os pendentes do user (None = todos)."""
+        if owner_id is None:
+            needed = self._pending or self._lock.locked()
+        else:
+            needed = owner_id in self._by_owner or self._lock.locked()
+        if needed:
+            await self.flush(owner_id)
+
+    async def flush(self, owner_id: Optional[int] = None) -> int:
+        # um flush de cada vez: quem espera pelo lock vê o anterior já commitado
+        async with self._lock:
+            if owner_id is None:
+                todo_ids = list(self._pending)
+            else:
+                todo_ids = list(self._by_owner.get(owner_id, ()))
+            written = 0
+            for start in range(0, len(todo_ids), self.max_batch):
+                # entre lotes pode ter havido um discard (delete): esses já não estão na fila
+                taken = ((todo_id, self._take(todo_id)) for todo_id in todo_ids[start:start + self.max_batch])
+                batch = {todo_id: entry for todo_id, entry in taken if entry is not None}
+                if batch:
+                    written += await self._write(batch)
+            return written
+
+    def _take(self, todo_id: int) -> Optional[PendingUpdate]:
+        entry = self._pending.pop(todo_id, None)
+        if entry is not None:
+            owned = self._by_owner.get(entry.owner_id)
+            owned.discard(todo_id)
+            if not owned:
+                del self._by_owner[entry.owner_id]
+        return entry
+
+    async def _write(self, batch: dict) -> int:
+        self._inflight.update(batch)
+        started = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(_UPDATE, [
+                    {**entry.values, "b_id": todo_id, "b_owner_id": entry.owner_id}
+                    for todo_id, entry in batch.items()
+                ])
+                await db.commit()
+        except Exception as e:
+            print("WRITE_BEHIND FLUSH ERROR:", type(e).__name__, str(e))
+            self.failures += 1
+            # volta para a fila (tenta no próximo ciclo), sem passar por cima de updates mais novos
+            dropped = []
+            for todo_id, entry in batch.items():
+                if todo_id in self._pending:
+                    continue
+                entry.failures += 1
+                if entry.failures >= self.max_retries:
+                    dropped.append(todo_id)
+                    continue
+                self._pending[todo_id] = entry
+                self._by_owner.setdefault(entry.owner_id, set()).add(todo_id)
+            if dropped:
+                # um lote que falha sempre (ex. uma linha inválida) não pode ficar na fila para sempre
+                self.dropped += len(dropped)
+                print("WRITE_BEHIND DROPPED:", len(dropped), "updates after", self.max_retries,
+                      "failed flushes, todo ids", sorted(dropped))
+            return 0
+        finally:
+            for todo_id in batch:
+                self._inflight.pop(todo_id, None)
+
+        now = time.monotonic()
+        flush_duration.observe(time.perf_counter() - started)
+        flush_rows.observe(len(batch))
+        for entry in batch.values():
+            flush_delay.observe(now - entry.first_at)
+        self.written += len(batch)
+        self.flushes += 1
+        # já commitado: um erro aqui (cache/eventos) não volta a pôr o lote na fila
+        try:
+            for owner_id in {entry.owner_id for entry in batch.values()}:
+                await todo_cache.invalidate(owner_id)
+            for todo_id, entry in batch.items():
+                await event_bus.publish(entry.owner_id, "todo.updated",
+                                        {"id": todo_id, **entry.values, "owner_id": entry.owner_id})
+        except Exception as e:
+            print("WRITE_BEHIND NOTIFY ERROR:", type(e).__name__, str(e))
+        return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.window)
+            # o ciclo não pode morrer: sem ele os updates aceites nunca chegavam à BD
+            try:
+                if self._pending:
+                    await self.flush()
+            except Exception as e:
+                print("WRITE_BEHIND ERROR:", type(e).__name__, str(e))
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        """Shutdown (depois de acabarem os pedidos): pára o ciclo e escreve o que falta."""
+        self.enabled = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for attempt in range(SHUTDOWN_FLUSH_ATTEMPTS):
+            if not self._pending:
+                return
+            if attempt:
+                await asyncio.sleep(attempt)
+            await self.flush()
+        if self._pending:
+            print("WRITE_BEHIND LOST:", len(self._pending), "updates, todo ids", sorted(self._pending))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "window": self.window,
+            "pending": len(self._pending),
+            "accepted": self.accepted,
+            "coalesced": self.coalesced,
+            "written": self.written,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            # updates aceites por linha escrita (1.0 = nada juntado)
+            "coalescing_ratio": self.accepted / self.written if self.written else 0.0,
+        }
+
+
+write_behind = WriteBehindQueue(TODO_WRITE_BEHIND, TODO_WRITE_BEHIND_WINDOW, TODO_WRITE_BEHIND_MAX_PENDING,
+                                TODO_WRITE_BEHIND_MAX_BATCH, TODO_WRITE_BEHIND_MAX_RETRIES)